@@ -0,0 +1,760 @@
+import hashlib
+import json
+import os
+import queue
+import re
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+from fractions import Fraction
+from pathlib import Path
+
+DEFAULT_SEGMENT_CACHE_DIR = '~/.cache/presenting_and_recording/segments'
+DEFAULT_PROBE_CACHE_FILE = '~/.cache/presenting_and_recording/probe.json'
+
+
+class SegmentCache():
+  # encoded video segments, keyed by the hash of their content and encoder
+  # settings. least recently used segments are evicted once the cache exceeds
+  # max_size_mb.
+
+  def __init__(self, cache_dir=DEFAULT_SEGMENT_CACHE_DIR, max_size_mb=1024):
+    self.cache_dir = Path(cache_dir).expanduser()
+    self.cache_dir.mkdir(parents=True, exist_ok=True)
+    self.max_size = int(max_size_mb * 1024 * 1024)
+
+  def key(self, data, *params):
+    h = hashlib.sha256(data)
+    h.update(repr(params).encode('utf-8'))
+    return h.hexdigest()
+
+  def path(self, key):
+    return self.cache_dir / (key + '.mp4')
+
+  def get(self, key):
+    p = self.path(key)
+    if not p.exists():
+      return None
+    # touch the file so eviction sees it as recently used
+    os.utime(p)
+    return p
+
+  def put(self, key, encode):
+    # encode is called with a temporary path, must write an mp4 to it and return
+    # whether it succeeded. a failed segment is never cached
+    p = self.path(key)
+    tmp = p.with_suffix('.part')
+    try:
+      ok = encode(tmp)
+    except BaseException:
+      tmp.unlink(missing_ok=True)
+      raise
+    if not ok:
+      tmp.unlink(missing_ok=True)
+      raise Exception(f"could not encode the segment '{p.name}'")
+    os.replace(tmp, p)
+    return p
+
+  def evict(self):
+    entries = []
+    total = 0
+    for p in self.cache_dir.glob('*.mp4'):
+      st = p.stat()
+      entries.append((st.st_mtime, st.st_size, p))
+      total += st.st_size
+    if total <= self.max_size:
+      return
+    entries.sort()
+    for _, fsize, p in entries:
+      p.unlink(missing_ok=True)
+      total -= fsize
+      if total <= self.max_size * .9:
+        break
+
+
+def segment_cache_from_config(config):
+  return SegmentCache(config.get('RecordProduceSegmentCacheDir', DEFAULT_SEGMENT_CACHE_DIR),
+                      config.getfloat('RecordProduceSegmentCacheMaxSize', 1024))
+
+
+class RecorderStartMonitor():
+  # follows the log output of a recording ffmpeg in a thread and copies it to
+  # logfile. the monotonic time every output is opened and the time the first
+  # frame is written are taken the moment ffmpeg reports them. state() never
+  # blocks, it's meant to be polled from the ui. the thread keeps copying the
+  # log until ffmpeg exits, and keeps the latest statistics ffmpeg reported and
+  # the number of warnings about full input queues for health()
+  START = re.compile(r'^(frame|size)= *\d+')
+  ERROR = re.compile(r'^.*(Device or resource busy|Inappropriate ioctl for device|Input/output error|not found)$')
+  QUEUE = re.compile(r'thread_queue_size|buffer too full|frame dropped')
+
+  def __init__(self, proc, logfile, outputs):
+    # outputs maps a name to the output file it is recorded to
+    self.proc = proc
+    self.logfile = logfile
+    self.launched = time.monotonic()
+    self.output_patterns = {name: re.compile(r'^Output [^\']*\'' + re.escape(filename) + '\'') for name, filename in outputs.items()}
+    self.opened = {}
+    self.started = None
+    self.error = None
+    self.stats = None
+    self.queue_warnings = 0
+    self.thread = threading.Thread(target=self.read, daemon=True)
+    self.thread.start()
+
+  def read(self):
+    for line in self.proc.stderr:
+      now = time.monotonic()
+      print(line.rstrip('\n'), file=self.logfile, flush=True)
+      if self.START.match(line):
+        self.stats = parse_stats(line)
+      elif self.QUEUE.search(line):
+        self.queue_warnings += 1
+      if self.started is not None or self.error is not None:
+        continue
+      for name, pattern in self.output_patterns.items():
+        if pattern.match(line):
+          self.opened[name] = now
+      if self.START.match(line):
+        self.started = now
+      elif self.ERROR.match(line):
+        self.error = line.strip()
+
+  def state(self, timeout=None):
+    # 'started', 'waiting' or 'failed'. ffmpeg exiting before the first frame
+    # and running into the timeout count as failures as well
+    if self.started is not None:
+      return 'started'
+    if self.error is not None or self.proc.poll() is not None:
+      return 'failed'
+    if timeout is not None and time.monotonic() - self.launched > timeout:
+      return 'failed'
+    return 'waiting'
+
+  def offset(self, name):
+    # how long before the first frame the output was opened. outputs that weren't
+    # reported count from the launch of ffmpeg
+    return self.started - self.opened.get(name, self.launched)
+
+  def health(self):
+    # None until ffmpeg reported its first statistics
+    stats = self.stats
+    if stats is None:
+      return None
+    return dict(stats, queue=self.queue_warnings)
+
+
+def parse_stats(line):
+  # the statistics line ffmpeg keeps updating while it runs, like
+  # frame=  250 fps= 25 q=-1.0 size=  1024kB time=00:00:10.00 bitrate= 838.9kbits/s dup=0 drop=2 speed=   1x
+  # dup and drop are only reported once they aren't zero
+  values = dict(re.findall(r'(\w+)= *(\S+)', line))
+  def number(key):
+    try:
+      return float(values[key].rstrip('x'))
+    except (KeyError, ValueError):
+      return None
+  return {
+    'frame': number('frame'),
+    'fps': number('fps'),
+    'dup': number('dup') or 0,
+    'drop': number('drop') or 0,
+    'speed': number('speed'),
+  }
+
+
+def source_rate(source):
+  # the frame rate a capture source asks for with -r or -framerate, like
+  # '-f x11grab -r 10 -i :0.0', or None if it leaves it to the device
+  m = re.search(r'(?:^|\s)-(?:r|framerate)\s+(\S+)', source)
+  if m is None:
+    return None
+  try:
+    return float(Fraction(m.group(1)))
+  except (ValueError, ZeroDivisionError):
+    return None
+
+
+def segment_file(filename, k):
+  p = Path(filename)
+  return str(p.with_name(f"{p.stem}-seg{k}{p.suffix}"))
+
+
+class RecordingSegments():
+  # the segments of a recording that was paused. a pause ends the running ffmpeg
+  # and resuming starts a new one, the files of every finished segment are
+  # renamed to <file>-seg<k>. length is the time from a segment's first frame to
+  # the pause, offsets are how long before the first frame every stream's file
+  # starts. a recording without pauses has no segments
+
+  def __init__(self, path):
+    self.path = Path(path)
+    try:
+      with open(self.path, 'r') as f:
+        data = json.load(f)
+    except (FileNotFoundError, ValueError):
+      data = {}
+    # maps the name of a stream to the file the joined segments are written to
+    self.streams = data.get('streams', {})
+    self.segments = data.get('segments', [])
+
+  def add(self, streams, length, offsets, cwd=None):
+    k = len(self.segments)
+    for filename in streams.values():
+      if Path(cwd or '.', filename).exists():
+        os.replace(Path(cwd or '.', filename), Path(cwd or '.', segment_file(filename, k)))
+    self.streams = dict(streams)
+    self.segments.append({'length': length, 'offsets': dict(offsets)})
+    self.save()
+
+  def save(self):
+    tmp = self.path.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+      json.dump({'streams': self.streams, 'segments': self.segments}, f, indent=1)
+    os.replace(tmp, self.path)
+
+  def files(self, name):
+    return [segment_file(self.streams[name], k) for k in range(len(self.segments))]
+
+  def concat_list(self, name, start_time=lambda filename: 0.):
+    # an ffconcat list that joins the stream's segments such that every segment's
+    # first frame lands where the previous one paused. a segment's file is cut
+    # where the next one's head start begins, the offset of the first segment
+    # stays and is applied in production as before. start_time gives the
+    # timestamp a file starts at
+    lines = ["ffconcat version 1.0"]
+    for k, filename in enumerate(self.files(name)):
+      quoted = filename.replace("'", "'\\''")
+      lines.append(f"file '{quoted}'")
+      segment = self.segments[k]
+      if k + 1 < len(self.segments):
+        head_start = self.segments[k+1]['offsets'].get(name, 0.)
+        outpoint = (start_time(filename) or 0.) + segment['length'] + segment['offsets'].get(name, 0.) - head_start
+        lines.append(f"outpoint {outpoint:.6f}")
+    return '\n'.join(lines) + '\n'
+
+
+class CaptureTranscoder():
+  # compresses a lossless capture while it is still recorded. ffmpeg's segment
+  # muxer writes the capture in rolling segments and lists every completed one,
+  # a thread encodes these at low priority and deletes them. finish() encodes the
+  # rest once the capture ended and joins the encoded segments into output
+  # without re-encoding, finish_async() does so in a thread. lossless segments
+  # that fail to encode are kept
+
+  def __init__(self, output, encode_args, segment_length=60, cwd=None, log=print):
+    self.output = output
+    self.encode_args = encode_args
+    self.segment_length = segment_length
+    self.cwd = cwd
+    self.log = log
+    p = Path(output)
+    self.pattern = str(p.with_name(f"{p.stem}-lossless-%05d{p.suffix}"))
+    self.listfile = str(p.with_name(f"{p.stem}-lossless.csv"))
+    self.encoded = []
+    self.failed = []
+    self.stopping = threading.Event()
+    self.thread = None
+    # set once finish_async is done, with finish()'s result in ok
+    self.finished = threading.Event()
+    self.ok = None
+
+  def path(self, filename):
+    return Path(self.cwd or '.', filename)
+
+  def muxer_args(self):
+    # replace the output file of the capture with these
+    return ['-f', 'segment', '-segment_time', str(self.segment_length), '-reset_timestamps', '1',
+            '-segment_list', self.listfile, '-segment_list_type', 'csv', self.pattern]
+
+  def start(self):
+    self.path(self.listfile).unlink(missing_ok=True)
+    self.thread = threading.Thread(target=self.run, daemon=True)
+    self.thread.start()
+
+  def completed(self):
+    # the segment muxer adds a segment to the list once it is written
+    try:
+      with open(self.path(self.listfile), 'r') as f:
+        return [line.split(',')[0] for line in f if line.strip()]
+    except FileNotFoundError:
+      return []
+
+  def run(self):
+    done = 0
+    while True:
+      stopping = self.stopping.is_set()
+      segments = self.completed()
+      for filename in segments[done:]:
+        self.encode(filename)
+      done = len(segments)
+      # the capture ended before the list was read, so it is complete
+      if stopping:
+        break
+      self.stopping.wait(1)
+
+  def encode(self, filename):
+    out = filename.replace('-lossless-', '-encoded-')
+    cmd = ['ffmpeg', '-y', '-nostdin', '-loglevel', 'error', '-i', filename] + self.encode_args + [out]
+    # the capture must not drop frames for this
+    if subprocess.run(cmd, cwd=self.cwd, preexec_fn=lambda: os.nice(19)).returncode == 0:
+      self.path(filename).unlink(missing_ok=True)
+      self.encoded.append(out)
+    else:
+      self.log(f"couldn't encode '{filename}', the lossless segment is kept")
+      self.failed.append(filename)
+
+  def finish(self):
+    # returns whether output was written
+    self.stopping.set()
+    self.thread.join()
+    if self.failed or not self.encoded:
+      return False
+    listfile = str(Path(self.output).with_name(f"{Path(self.output).stem}-encoded.ffconcat"))
+    with open(self.path(listfile), 'w') as f:
+      print("ffconcat version 1.0", file=f)
+      for filename in self.encoded:
+        quoted = filename.replace("'", "'\\''")
+        print(f"file '{quoted}'", file=f)
+    cmd = ['ffmpeg', '-y', '-nostdin', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', listfile, '-map', '0', '-c', 'copy', self.output]
+    if subprocess.run(cmd, cwd=self.cwd).returncode != 0:
+      self.log(f"couldn't join the encoded segments of '{self.output}', they are kept")
+      return False
+    for filename in self.encoded + [listfile, self.listfile]:
+      self.path(filename).unlink(missing_ok=True)
+    return True
+
+  def finish_async(self):
+    def run():
+      try:
+        self.ok = self.finish()
+      finally:
+        self.finished.set()
+    threading.Thread(target=run, daemon=True).start()
+
+
+def capture_transcoder_from_config(config, output, cwd=None, log=print):
+  if not config.getboolean('RecordTranscodeScreen', False):
+    return None
+  encode_args = config.get('FfmpegTranscodeScreen', '-c:v libx264 -preset veryfast -crf 20 -pix_fmt yuv420p').split(' ')
+  return CaptureTranscoder(output, encode_args, config.getint('RecordTranscodeScreenSegmentLength', 60), cwd, log)
+
+
+def threads_args(threads):
+  return ['-threads', str(threads)] if threads else []
+
+def with_threads(cmd, outputs, threads):
+  # -threads is an output option, it goes before every output file of the
+  # command, which share the threads. the output file comes last if none of
+  # outputs is found
+  positions = [k for k, arg in enumerate(cmd) if k > 0 and arg in outputs and cmd[k-1] != '-i'] or [len(cmd) - 1]
+  args = threads_args(max(1, threads // len(positions)) if threads else None)
+  for k in reversed(positions):
+    cmd = cmd[:k] + args + cmd[k:]
+  return cmd
+
+def cmd_inputs(cmd):
+  return [cmd[k+1] for k, arg in enumerate(cmd[:-1]) if arg == '-i']
+
+
+class BuildManifest():
+  # remembers how every produced file was built: the size and modification time
+  # of its inputs, the ffmpeg command and further parameters. a step is up to
+  # date if this fingerprint didn't change and its outputs are still the files
+  # it wrote. rebuilding a step changes its outputs' modification times, so the
+  # steps reading them are rebuilt as well
+
+  def __init__(self, path):
+    self.path = Path(path)
+    self.lock = threading.Lock()
+    try:
+      with open(self.path, 'r') as f:
+        self.entries = json.load(f)
+    except (FileNotFoundError, ValueError):
+      self.entries = {}
+
+  def stat(self, filename, cwd=None):
+    try:
+      st = Path(cwd or '.', filename).stat()
+    except OSError:
+      return [str(filename), None, None]
+    return [str(filename), st.st_size, st.st_mtime_ns]
+
+  def fingerprint(self, job, inputs=None, params=None, cwd=None):
+    if inputs is None:
+      inputs = [] if callable(job) else cmd_inputs(job)
+    data = {
+      'cmd': None if callable(job) else [str(arg) for arg in job],
+      'inputs': [self.stat(i, cwd) for i in inputs],
+      'params': params,
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+  def up_to_date(self, name, fingerprint, outputs, cwd=None):
+    entry = self.entries.get(name)
+    if entry is None or entry['fingerprint'] != fingerprint:
+      return False
+    stats = [self.stat(o, cwd) for o in outputs]
+    return all(st[1] is not None for st in stats) and stats == entry['outputs']
+
+  def record(self, name, fingerprint, outputs, cwd=None):
+    with self.lock:
+      self.entries[name] = {'fingerprint': fingerprint, 'outputs': [self.stat(o, cwd) for o in outputs]}
+      tmp = self.path.with_suffix('.tmp')
+      with open(tmp, 'w') as f:
+        json.dump(self.entries, f, indent=1)
+      os.replace(tmp, self.path)
+
+
+class MediaProbe():
+  # the stream and format info of media files, as ffprobe reports it in a single
+  # run per file. results are memoized by the file's absolute path, size and
+  # modification time, in memory and, with a cache file, on disk so they
+  # survive the process. files that don't exist or ffprobe can't read give None
+
+  def __init__(self, cache_file=None):
+    self.cache_file = Path(cache_file).expanduser() if cache_file else None
+    self.lock = threading.Lock()
+    self.entries = {}
+    if self.cache_file is not None:
+      try:
+        with open(self.cache_file, 'r') as f:
+          self.entries = json.load(f)
+      except (FileNotFoundError, ValueError):
+        pass
+
+  def probe(self, filename, cwd=None):
+    path = Path(cwd or '.', filename).absolute()
+    try:
+      st = path.stat()
+    except OSError:
+      return None
+    stamp = [st.st_size, st.st_mtime_ns]
+    with self.lock:
+      entry = self.entries.get(str(path))
+      if entry is not None and entry['stat'] == stamp:
+        return entry['info']
+    cmd = ['ffprobe', '-v', 'error', '-show_streams', '-show_format', '-of', 'json', str(path)]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE)
+    try:
+      info = json.loads(result.stdout.decode('utf-8')) if result.returncode == 0 else None
+    except ValueError:
+      info = None
+    if info is not None:
+      with self.lock:
+        # a changed file replaces the entry of its previous version
+        self.entries[str(path)] = {'stat': stamp, 'info': info}
+        self.save()
+    return info
+
+  def save(self):
+    if self.cache_file is None:
+      return
+    self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = self.cache_file.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+      json.dump(self.entries, f)
+    os.replace(tmp, self.cache_file)
+
+  def video_stream(self, filename, cwd=None):
+    info = self.probe(filename, cwd) or {}
+    return next((st for st in info.get('streams', []) if st.get('codec_type') == 'video'), None)
+
+  def framerate(self, filename, cwd=None):
+    # the frame rate of the first video stream, rounded to whole frames
+    stream = self.video_stream(filename, cwd)
+    try:
+      fps = Fraction(stream['r_frame_rate'])
+    except (TypeError, KeyError, ValueError, ZeroDivisionError):
+      return None
+    return round(fps) if fps > 0 else None
+
+  def width_and_height(self, filename, cwd=None):
+    stream = self.video_stream(filename, cwd)
+    if stream is None:
+      return (None, None)
+    return (stream.get('width'), stream.get('height'))
+
+  def duration(self, filename, cwd=None):
+    info = self.probe(filename, cwd) or {}
+    try:
+      return float(info['format']['duration'])
+    except (KeyError, ValueError):
+      return None
+
+  def start_time(self, filename, cwd=None):
+    info = self.probe(filename, cwd) or {}
+    try:
+      return float(info['format']['start_time'])
+    except (KeyError, ValueError):
+      return None
+
+
+def media_probe_from_config(config):
+  if not config.getboolean('RecordProduceProbeCache', True):
+    return MediaProbe()
+  return MediaProbe(config.get('RecordProduceProbeCacheFile', DEFAULT_PROBE_CACHE_FILE))
+
+
+def run_ffmpeg(cmd, cwd=None, on_progress=None):
+  # runs ffmpeg with its progress written to stdout instead of the statistics
+  # on stderr. on_progress is called with the key/value pairs of every progress
+  # block, roughly twice a second. returns ffmpeg's exit code
+  cmd = cmd[:1] + ['-progress', 'pipe:1', '-nostats'] + cmd[1:]
+  proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, text=True)
+  block = {}
+  for line in proc.stdout:
+    key, _, value = line.strip().partition('=')
+    block[key] = value
+    if key == 'progress':
+      if on_progress is not None:
+        on_progress(block)
+      block = {}
+  return proc.wait()
+
+def parse_progress(block):
+  def number(value):
+    try:
+      return float(value.rstrip('x'))
+    except (AttributeError, ValueError):
+      return None
+  # out_time_ms is in microseconds as well, older ffmpeg versions only have it
+  out_time = number(block.get('out_time_us', block.get('out_time_ms')))
+  return {
+    'out_time': out_time / 1e6 if out_time is not None else None,
+    'fps': number(block.get('fps')),
+    'speed': number(block.get('speed')),
+  }
+
+def format_seconds(seconds):
+  m, s = divmod(int(seconds), 60)
+  h, m = divmod(m, 60)
+  return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+def format_progress(entry):
+  parts = [Path(entry['name']).name]
+  if entry['percent'] is not None:
+    parts.append(f"{entry['percent']:.0f}%")
+  elif entry['out_time'] is not None:
+    parts.append(format_seconds(entry['out_time']))
+  else:
+    parts.append(format_seconds(entry['elapsed']))
+  if entry['fps']:
+    parts.append(f"{entry['fps']:.0f} fps")
+  if entry['speed']:
+    parts.append(f"{entry['speed']:.2f}x")
+  if entry['eta'] is not None:
+    parts.append("ETA " + format_seconds(entry['eta']))
+  return ' '.join(parts)
+
+def print_progress(snapshot, file=sys.stderr):
+  print('\r\033[K' + ' | '.join(format_progress(entry) for entry in snapshot), end='', file=file, flush=True)
+
+
+class ProductionProgress():
+  # progress of the running jobs as ffmpeg reports it, and the timing of the
+  # finished ones. jobs report from their own threads, show is only called from
+  # the thread that created the tracker: on every report of its own jobs, and
+  # whenever the scheduler waiting in it calls refresh. probe looks up the
+  # duration of the jobs' inputs
+
+  def __init__(self, show=None, probe=None):
+    self.show = show
+    self.probe = probe or MediaProbe()
+    self.owner = threading.current_thread()
+    self.lock = threading.Lock()
+    self.running = {}
+    self.steps = []
+
+  def start(self, name, duration=None, threads=None):
+    with self.lock:
+      self.running[name] = {'name': name, 'duration': duration, 'threads': threads, 'started': time.time(),
+                            'out_time': None, 'fps': None, 'speed': None}
+    self.changed()
+
+  def update(self, name, block):
+    with self.lock:
+      if name in self.running:
+        # the final block may lack some of the values
+        self.running[name].update((k, v) for k, v in parse_progress(block).items() if v is not None)
+    self.changed()
+
+  def finish(self, name, status, outputs=(), cwd=None):
+    sizes = [Path(cwd or '.', o).stat().st_size for o in outputs if Path(cwd or '.', o).exists()]
+    with self.lock:
+      entry = self.running.pop(name, None) or {'started': time.time(), 'threads': None, 'out_time': None, 'fps': None, 'speed': None}
+      wall = time.time() - entry['started']
+      self.steps.append({
+        'name': name,
+        'status': status,
+        'wall_time': round(wall, 3),
+        'media_time': entry['out_time'],
+        # media seconds produced per second, like ffmpeg's speed
+        'speed': round(entry['out_time'] / wall, 3) if entry['out_time'] and wall > 0 else None,
+        'fps': entry['fps'],
+        'output_size': sum(sizes),
+        'threads': entry['threads'],
+      })
+    self.changed()
+
+  def snapshot(self):
+    now = time.time()
+    entries = []
+    with self.lock:
+      for entry in self.running.values():
+        entry = dict(entry, elapsed=now - entry['started'], percent=None, eta=None)
+        if entry['duration'] and entry['out_time'] is not None:
+          entry['percent'] = min(100, 100 * entry['out_time'] / entry['duration'])
+          if entry['out_time'] > 0:
+            rate = entry['out_time'] / entry['elapsed']
+            entry['eta'] = max(0, entry['duration'] - entry['out_time']) / rate
+        entries.append(entry)
+    return entries
+
+  def changed(self):
+    if threading.current_thread() is self.owner:
+      self.refresh()
+
+  def refresh(self):
+    if self.show is not None:
+      self.show(self.snapshot())
+
+  def write_report(self, path):
+    with self.lock:
+      report = {'created': datetime.now().isoformat(timespec='seconds'), 'steps': list(self.steps)}
+    with open(path, 'w') as f:
+      json.dump(report, f, indent=1)
+
+
+def execute_job(name, job, threads=None, cwd=None, log=print, manifest=None, progress=None,
+                inputs=None, params=None, outputs=None, duration=None):
+  # runs an ffmpeg command or calls a function with the number of threads that
+  # returns whether it succeeded, and returns whether it did. with a manifest, up to date jobs are skipped and
+  # None is returned. inputs defaults to the command's input files, outputs to
+  # the job's name. the progress of a command is relative to duration, which
+  # defaults to the longest of its inputs
+  outputs = outputs or [name]
+  if manifest is not None:
+    fingerprint = manifest.fingerprint(job, inputs, params, cwd)
+    if manifest.up_to_date(name, fingerprint, outputs, cwd):
+      print(f"{name}: up to date")
+      if progress is not None:
+        progress.finish(name, 'up to date', outputs, cwd)
+      return None
+  if progress is not None:
+    if duration is None and not callable(job):
+      durations = [progress.probe.duration(i, cwd) for i in cmd_inputs(job)]
+      duration = max([d for d in durations if d], default=None)
+    progress.start(name, duration, threads)
+  ok = False
+  try:
+    if callable(job):
+      ok = bool(job(threads))
+    else:
+      cmd = with_threads(job, outputs, threads)
+      log(cmd)
+      on_progress = (lambda block: progress.update(name, block)) if progress is not None else None
+      ok = run_ffmpeg(cmd, cwd, on_progress) == 0
+  finally:
+    if progress is not None:
+      progress.finish(name, 'done' if ok else 'failed', outputs, cwd)
+  if ok and manifest is not None:
+    manifest.record(name, fingerprint, outputs, cwd)
+  return ok
+
+
+class JobScheduler():
+  # runs production steps as soon as the steps they depend on are done, at most
+  # max_jobs at the same time. a job is either an ffmpeg command or a function
+  # that is called with the number of threads it may use and returns whether it
+  # succeeded. the thread budget is
+  # split between the jobs that may run together, ffmpeg gets its share as -threads.
+  # a job keeps its share until it's done, new jobs get at most what the running
+  # ones leave, so together they never use more than the budget.
+  # jobs are named after the file they produce, dependencies on files that no
+  # job produces are considered to exist already
+
+  def __init__(self, threads=None, max_jobs=2, cwd=None, log=print, manifest=None, progress=None):
+    self.threads = threads or os.cpu_count() or 1
+    self.max_jobs = max(1, max_jobs)
+    self.cwd = cwd
+    self.log = log
+    self.manifest = manifest
+    self.progress = progress
+    self.jobs = {}
+
+  def add(self, name, job, deps=(), **options):
+    # options are passed on to execute_job
+    self.jobs[name] = (job, list(deps), options)
+
+  def execute(self, name, job, options, threads, finished):
+    t = time.time()
+    ok = False
+    try:
+      ok = execute_job(name, job, threads, self.cwd, self.log, self.manifest, self.progress, **options)
+    except Exception:
+      traceback.print_exc()
+    if ok is not None:
+      print(f"{name}: {'done' if ok else 'failed'} after {time.time() - t:.1f}s with {threads} threads")
+    finished.put((name, ok is not False))
+
+  def run(self):
+    # returns whether each job succeeded. jobs whose dependencies failed are skipped
+    pending = dict(self.jobs)
+    done = {}
+    # the threads of every running job
+    running = {}
+    finished = queue.Queue()
+    while pending or running:
+      ready = []
+      skipped = False
+      for name, (job, deps, _) in list(pending.items()):
+        if any(done.get(d) is False for d in deps):
+          print(f"{name}: skipped, {', '.join(d for d in deps if done.get(d) is False)} failed")
+          del pending[name]
+          done[name] = False
+          skipped = True
+        elif all(d in done or d not in self.jobs for d in deps):
+          ready.append(name)
+      # every job needs at least one thread
+      left = self.threads - sum(running.values())
+      ready = ready[:min(self.max_jobs - len(running), left)]
+      if ready:
+        share = max(1, min(self.threads // min(self.max_jobs, len(running) + len(pending)), left // len(ready)))
+        for name in ready:
+          job, _, options = pending.pop(name)
+          running[name] = share
+          threading.Thread(target=self.execute, args=(name, job, options, share, finished), daemon=True).start()
+      if not running:
+        if skipped:
+          continue
+        if pending:
+          raise Exception("circular dependencies between " + ', '.join(pending))
+        break
+      while True:
+        try:
+          name, ok = finished.get(timeout=.5)
+          break
+        except queue.Empty:
+          if self.progress is not None:
+            self.progress.refresh()
+      del running[name]
+      done[name] = ok
+    self.jobs = {}
+    return done
+
+
+def job_scheduler_from_config(config, cwd=None, log=print, manifest=None, progress=None):
+  max_jobs = config.getint('RecordProduceParallelJobs', 3)
+  if max_jobs < 2:
+    return None
+  return JobScheduler(config.getint('RecordProduceThreads', os.cpu_count() or 1), max_jobs, cwd, log, manifest, progress)
+
+
+def build_manifest_from_config(config, path):
+  if not config.getboolean('RecordProduceIncremental', True):
+    return None
+  return BuildManifest(path)
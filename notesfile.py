@@ -0,0 +1,143 @@
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import re
+import struct
+from pathlib import Path
+
+SECTION = re.compile(r'^#[ \t]*(\d+).*$', re.M)
+TITLE = re.compile(r'^#title:\s+(.*)')
+
+# inotify(7)
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+EVENT = struct.Struct('iIII')
+
+
+def split_sections(text):
+  # returns (slide, text) for every '#NN' section, the slide as it is written. a
+  # file without sections is a single section for slide None, the text before the
+  # first section is ignored
+  heads = list(SECTION.finditer(text))
+  if not heads:
+    return [(None, text)]
+  sections = []
+  for k, m in enumerate(heads):
+    end = heads[k+1].start() if k + 1 < len(heads) else len(text)
+    sections.append((m.group(1), text[m.end():end]))
+  return sections
+
+
+def parse_section(text):
+  # returns the notes and the title of a section, the last '#title:' line wins
+  title = None
+  lines = []
+  for line in text.splitlines(keepends=True):
+    m = TITLE.match(line)
+    if m:
+      title = m.group(1).strip()
+    else:
+      lines.append(line)
+  return ''.join(lines).strip(), title
+
+
+class NotesFile():
+  # the notes of a deck, one section per slide starting with a '#NN' line and
+  # maybe a '#title: ...' line. notes holds the html of every slide, titles their
+  # titles. load() converts only the sections whose text changed since it last
+  # ran, and returns the slides that changed
+
+  def __init__(self, path, convert):
+    self.path = Path(path)
+    self.convert = convert
+    self.hashes = {}
+    self.notes = {}
+    self.titles = {}
+
+  def load(self):
+    # a missing file has no sections at all, not an empty one for slide None
+    sections = split_sections(self.path.read_text()) if self.path.exists() else []
+    hashes = {}
+    for slide, section in sections:
+      if slide in hashes:
+        raise Exception('slide has more than one notes section')
+      hashes[slide] = (hashlib.sha1(section.encode('utf-8')).digest(), section)
+    changed = set()
+    for slide, (digest, section) in hashes.items():
+      if self.hashes.get(slide) != digest:
+        notes, title = parse_section(section)
+        self.notes[slide] = self.convert(notes)
+        if title is None:
+          self.titles.pop(slide, None)
+        else:
+          self.titles[slide] = title
+        changed.add(slide)
+    for slide in set(self.hashes) - set(hashes):
+      self.notes.pop(slide, None)
+      self.titles.pop(slide, None)
+      changed.add(slide)
+    self.hashes = {slide: digest for slide, (digest, _) in hashes.items()}
+    return changed
+
+
+class FileWatcher():
+  # tells whether a file may have changed since changed() was last called. watches
+  # the file's directory with inotify, editors often replace a file instead of
+  # writing to it. where inotify isn't available the file's size and modification
+  # time are compared instead
+
+  def __init__(self, path):
+    self.path = Path(path)
+    self.fd = None
+    self.stamp = self.stat()
+    try:
+      libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+      fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+      if fd < 0:
+        return
+      mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+      if libc.inotify_add_watch(fd, os.fsencode(self.path.resolve().parent), mask) < 0:
+        os.close(fd)
+        return
+      self.fd = fd
+    except (OSError, AttributeError):
+      # no libc with inotify
+      pass
+
+  def stat(self):
+    try:
+      st = self.path.stat()
+      return st.st_size, st.st_mtime_ns
+    except FileNotFoundError:
+      return None
+
+  def changed(self):
+    if self.fd is None:
+      stamp = self.stat()
+      changed, self.stamp = stamp != self.stamp, stamp
+      return changed
+    name = os.fsencode(self.path.name)
+    changed = False
+    while True:
+      try:
+        data = os.read(self.fd, 4096)
+      except BlockingIOError:
+        return changed
+      offset = 0
+      while offset < len(data):
+        _, _, _, length = EVENT.unpack_from(data, offset)
+        offset += EVENT.size
+        if data[offset:offset+length].rstrip(b'\0') == name:
+          changed = True
+        offset += length
+
+  def close(self):
+    if self.fd is not None:
+      os.close(self.fd)
+      self.fd = None
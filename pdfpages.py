@@ -0,0 +1,474 @@
+import math
+import mmap
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PIL import Image, ImageDraw
+from PIL.Image import Resampling
+from pptxnotes import file_hash
+
+DEFAULT_PAGE_CACHE_DIR = '~/.cache/presenting_and_recording/pages'
+# not the temporary directory, that's often a tmpfs, where released pages stay in memory
+DEFAULT_PAGE_STORE_DIR = '~/.cache/presenting_and_recording'
+DEFAULT_LOAD_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def size_key(size):
+  # pdf2image accepts floats and None for the size, the cache key must not care
+  if size is None:
+    return "0x0"
+  if not isinstance(size, (tuple, list)):
+    size = (size, size)
+  return "x".join(str(round(s)) if s else "0" for s in size)
+
+
+class PageCache():
+  # content-addressed cache of rasterized pdf pages. a page is identified by
+  # the hash of the pdf, its index, the dpi and the requested size. entries are
+  # evicted least-recently-used first once the cache exceeds max_size_mb.
+
+  def __init__(self, cache_dir=DEFAULT_PAGE_CACHE_DIR, max_size_mb=2048):
+    self.cache_dir = Path(cache_dir).expanduser()
+    self.cache_dir.mkdir(parents=True, exist_ok=True)
+    self.max_size = int(max_size_mb * 1024 * 1024)
+
+  def path(self, pdf_hash, index, dpi, size):
+    return self.cache_dir / pdf_hash[:2] / f"{pdf_hash}-{index:04d}-{dpi}-{size_key(size)}.png"
+
+  def get(self, pdf_hash, index, dpi, size):
+    p = self.path(pdf_hash, index, dpi, size)
+    try:
+      img = Image.open(p)
+      img.load()
+    except (FileNotFoundError, OSError):
+      return None
+    # touch the file so eviction sees it as recently used
+    os.utime(p)
+    return img
+
+  def put(self, pdf_hash, index, dpi, size, img):
+    p = self.path(pdf_hash, index, dpi, size)
+    p.parent.mkdir(exist_ok=True)
+    tmp = p.with_suffix('.tmp')
+    img.save(tmp, 'png', compress_level=1)
+    os.replace(tmp, p)
+
+  def evict(self):
+    entries = []
+    total = 0
+    for p in self.cache_dir.glob('*/*.png'):
+      st = p.stat()
+      entries.append((st.st_mtime, st.st_size, p))
+      total += st.st_size
+    if total <= self.max_size:
+      return
+    entries.sort()
+    for _, fsize, p in entries:
+      p.unlink(missing_ok=True)
+      total -= fsize
+      if total <= self.max_size * .9:
+        break
+
+
+def page_cache_from_config(config):
+  if not config.getboolean('SlideCache', True):
+    return None
+  return PageCache(config.get('SlideCacheDir', DEFAULT_PAGE_CACHE_DIR),
+                   config.getfloat('SlideCacheMaxSize', 2048))
+
+def missing_runs(pages):
+  # yields (first, last) index pairs of consecutive pages that are still None
+  first = None
+  for i, page in enumerate(pages):
+    if page is None and first is None:
+      first = i
+    elif page is not None and first is not None:
+      yield first, i-1
+      first = None
+  if first is not None:
+    yield first, len(pages)-1
+
+def render_pages(pdffile, dpi, size, first_page=None, last_page=None, workers=1):
+  # every chunk of the page range is rendered by its own pdftoppm process. the
+  # threads only wait for them, so a thread pool keeps all cores busy. note that
+  # pdf2image's thread_count reads its pipes one after another and stalls
+  if first_page is None or last_page is None:
+    n_pages = pdfinfo_from_path(pdffile)['Pages']
+    first_page = first_page or 1
+    last_page = last_page or n_pages
+  n = last_page - first_page + 1
+  if workers <= 1 or n <= 1:
+    return convert_from_path(pdffile, size=size, dpi=dpi, first_page=first_page, last_page=last_page)
+  # smaller chunks than workers even out pages that take longer to render
+  chunk = max(1, math.ceil(n / (workers * 2)))
+  chunks = [(f, min(f + chunk - 1, last_page)) for f in range(first_page, last_page + 1, chunk)]
+  with ThreadPoolExecutor(max_workers=workers) as pool:
+    rendered = pool.map(lambda c: convert_from_path(pdffile, size=size, dpi=dpi, first_page=c[0], last_page=c[1]), chunks)
+    return [img for imgs in rendered for img in imgs]
+
+def load_pages(pdffile, dpi, size, cache=None, workers=1, store=None):
+  if cache is None:
+    return PageList(render_pages(pdffile, dpi, size, workers=workers), store, pdffile)
+  n_pages = pdfinfo_from_path(pdffile)['Pages']
+  pdf_hash = file_hash(pdffile)
+  pages = [cache.get(pdf_hash, i, dpi, size) for i in range(n_pages)]
+  hits = sum(page is not None for page in pages)
+  print(f"page cache: {hits}/{n_pages} pages of '{pdffile}' cached")
+  for first, last in list(missing_runs(pages)):
+    rendered = render_pages(pdffile, dpi, size, first+1, last+1, workers)
+    for i, img in enumerate(rendered, first):
+      pages[i] = img
+      cache.put(pdf_hash, i, dpi, size, img)
+  if hits < n_pages:
+    cache.evict()
+  return PageList(pages, store, pdffile)
+
+
+def fit_size(size, box):
+  # the size of an image scaled to fit into box, keeping its aspect ratio. like
+  # PIL's thumbnail, images are never enlarged
+  w, h = size
+  scale = min(box[0] / w, box[1] / h, 1)
+  return (max(1, round(w * scale)), max(1, round(h * scale)))
+
+class PagePyramid():
+  # a page and successively halved copies of it (1/2, 1/4, ...). every scaled
+  # version is resampled from the smallest level that is still at least as large
+  # as the requested size. levels are built on first use and kept
+  
+  def __init__(self, img, min_size=64):
+    self.levels = [img]
+    self.min_size = min_size
+    
+  @property
+  def size(self):
+    return self.levels[0].size
+  
+  def level(self, k):
+    while len(self.levels) <= k:
+      last = self.levels[-1]
+      if min(last.size) // 2 < self.min_size:
+        return None
+      self.levels.append(last.reduce(2))
+    return self.levels[k]
+  
+  def level_for(self, size):
+    k = 0
+    while True:
+      smaller = self.level(k + 1)
+      if smaller is None or smaller.width < size[0] or smaller.height < size[1]:
+        return self.levels[k]
+      k += 1
+  
+  def resize(self, size):
+    src = self.level_for(size)
+    img = src if src.size == size else src.resize(size, Resampling.LANCZOS)
+    # pages from a MappedPageStore are RGBX, which can't be saved as png
+    return img.convert('RGB') if img.mode != 'RGB' else (img.copy() if img is src else img)
+  
+  def thumbnail(self, box):
+    return self.resize(fit_size(self.size, box))
+
+
+class MappedPageStore():
+  # keeps pages uncompressed in a memory mapped temporary file instead of the
+  # python heap. pages are handed out as zero-copy Image.frombuffer views, which
+  # is only possible for RGBX. once the pages touched recently exceed
+  # max_resident_mb, the least recently used ones are released from memory with
+  # madvise, the kernel reads them back from the file on the next access. that
+  # only frees memory if the file is on a disk, not on a tmpfs
+  
+  def __init__(self, directory=DEFAULT_PAGE_STORE_DIR, max_resident_mb=1024):
+    directory = Path(directory).expanduser()
+    directory.mkdir(parents=True, exist_ok=True)
+    self.file = tempfile.TemporaryFile(dir=directory)
+    self.end = 0
+    self.max_resident = int(max_resident_mb * 1024 * 1024)
+    self.resident = OrderedDict()
+    self.maps = {}
+    self.lock = threading.Lock()
+  
+  def put(self, i, img):
+    img = img.convert('RGBX')
+    length = img.width * img.height * 4
+    with self.lock:
+      offset = self.end
+      self.end += math.ceil(length / mmap.ALLOCATIONGRANULARITY) * mmap.ALLOCATIONGRANULARITY
+      os.ftruncate(self.file.fileno(), self.end)
+    mm = mmap.mmap(self.file.fileno(), length, offset=offset)
+    mm[:] = img.tobytes()
+    self.maps[i] = mm
+    return Image.frombuffer('RGBX', img.size, mm, 'raw', 'RGBX', 0, 1)
+  
+  def touch(self, i):
+    # returns the pages that were released from memory
+    released = []
+    with self.lock:
+      if i in self.resident:
+        self.resident.move_to_end(i)
+        return released
+      self.resident[i] = len(self.maps[i])
+      total = sum(self.resident.values())
+      while total > self.max_resident and len(self.resident) > 1:
+        j, length = self.resident.popitem(last=False)
+        if hasattr(self.maps[j], 'madvise'):
+          self.maps[j].madvise(mmap.MADV_DONTNEED)
+        total -= length
+        released.append(j)
+    return released
+
+
+def page_store_from_config(config):
+  if not config.getboolean('SlideStoreMapped', True):
+    return None
+  return MappedPageStore(config.get('SlideStoreDir', DEFAULT_PAGE_STORE_DIR), config.getfloat('SlideStoreMaxResident', 1024))
+
+
+class PageList():
+  # the rasterized pages of a pdf. the pyramid of a page is built when it's
+  # first scaled and kept for all later sizes. with a MappedPageStore, pages
+  # live in its file and pyramids are dropped with the pages it releases.
+  # source is the pdf the pages were rasterized from
+  
+  def __init__(self, pages, store=None, source=None):
+    self.store = store
+    self.source = source
+    self.pyramids = {}
+    self.pages = [self.keep(i, page) for i, page in enumerate(pages)]
+  
+  def keep(self, i, img):
+    if self.store is None:
+      return img
+    img = self.store.put(i, img)
+    self.touched(i)
+    return img
+  
+  def touched(self, i):
+    if self.store is not None:
+      for j in self.store.touch(i):
+        self.pyramids.pop(j, None)
+  
+  def __len__(self):
+    return len(self.pages)
+  
+  def __getitem__(self, i):
+    self.touched(i)
+    return self.pages[i]
+  
+  def __iter__(self):
+    # like indexing, so pages that are iterated count as used
+    for i in range(len(self.pages)):
+      yield self[i]
+  
+  def is_ready(self, i):
+    return 0 <= i < len(self.pages)
+  
+  def pyramid(self, i):
+    # pages may be released by other threads, don't look the pyramid up twice
+    pyramid = self.pyramids.get(i)
+    if pyramid is None:
+      pyramid = self.pyramids[i] = PagePyramid(self[i])
+    return pyramid
+
+
+def build_atlas(pages, thumb_width, cols, pad=8):
+  # all pages as thumbnails in one packed grid image, e.g. for a slide sorter.
+  # pages that aren't rasterized yet are left grey, complete tells if any were
+  first = next((i for i in range(len(pages)) if is_page_ready(pages, i)), None)
+  if first is None:
+    return None, (thumb_width, thumb_width), False
+  w, h = pyramid_of(pages, first).size
+  cell = (thumb_width, max(1, round(thumb_width * h / w)))
+  rows = math.ceil(len(pages) / cols)
+  atlas = Image.new('RGB', (cols * (cell[0] + pad) + pad, rows * (cell[1] + pad) + pad), (60, 60, 60))
+  draw = ImageDraw.Draw(atlas)
+  complete = True
+  for i in range(len(pages)):
+    x = pad + (i % cols) * (cell[0] + pad)
+    y = pad + (i // cols) * (cell[1] + pad)
+    if is_page_ready(pages, i):
+      thumb = pyramid_of(pages, i).thumbnail(cell)
+      atlas.paste(thumb, (x + (cell[0] - thumb.width) // 2, y + (cell[1] - thumb.height) // 2))
+    else:
+      draw.rectangle((x, y, x + cell[0] - 1, y + cell[1] - 1), fill=(120, 120, 120))
+      complete = False
+    draw.text((x + 4, y + 2), str(i + 1), fill=(255, 0, 0))
+  return atlas, cell, complete
+
+def pyramid_of(pages, i):
+  if isinstance(pages, PageList):
+    return pages.pyramid(i)
+  return PagePyramid(pages[i])
+
+
+class LazyPages(PageList):
+  # a sequence of pdf pages that are rasterized one by one in a background
+  # thread. pages closest to the current position are rendered first. accessing
+  # a page that isn't ready yet moves it to the front of the queue and waits for it.
+  # a page the background thread failed to render is rendered again when it's
+  # accessed, and raises there if it fails again.
+
+  def __init__(self, pdffile, dpi, size, cache=None, workers=1, store=None):
+    self.store = store
+    self.pdffile = pdffile
+    self.source = pdffile
+    self.dpi = dpi
+    self.size = size
+    self.cache = cache
+    self.workers = max(1, workers)
+    self.pdf_hash = file_hash(pdffile) if cache is not None else None
+    self.n_pages = pdfinfo_from_path(pdffile)['Pages']
+    self.pages = [None] * self.n_pages
+    self.pyramids = {}
+    self.position = 0
+    self.urgent = []
+    self.rendering = set()
+    self.failed = {}
+    self.finished_workers = 0
+    self.cond = threading.Condition()
+    self.threads = []
+    self.load_start = None
+    self.load_duration = None
+
+  def __len__(self):
+    return self.n_pages
+
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      return [self[j] for j in range(*i.indices(self.n_pages))]
+    if i < 0:
+      i += self.n_pages
+    if not 0 <= i < self.n_pages:
+      raise IndexError('page index out of range')
+    # the page is rendered here when no worker will, but not while holding the
+    # lock, the workers and set_position would wait for pdftoppm
+    render = False
+    queued = False
+    with self.cond:
+      while self.pages[i] is None and not render:
+        if i in self.rendering:
+          self.cond.wait()
+        elif i in self.failed or not any(t.is_alive() for t in self.threads):
+          self.failed.pop(i, None)
+          self.rendering.add(i)
+          render = True
+        else:
+          if not queued:
+            self.urgent.append(i)
+            self.cond.notify_all()
+            queued = True
+          self.cond.wait()
+    if render:
+      try:
+        img = self.keep(i, self.render(i))
+      except Exception as e:
+        with self.cond:
+          self.failed[i] = e
+          self.rendering.discard(i)
+          self.cond.notify_all()
+        raise
+      with self.cond:
+        self.pages[i] = img
+        self.rendering.discard(i)
+        self.cond.notify_all()
+    self.touched(i)
+    return self.pages[i]
+
+  def __iter__(self):
+    for i in range(self.n_pages):
+      yield self[i]
+
+  def is_ready(self, i):
+    return 0 <= i < self.n_pages and self.pages[i] is not None
+
+  def set_position(self, i):
+    with self.cond:
+      self.position = i
+      self.cond.notify_all()
+
+  def render(self, i):
+    if self.cache is not None:
+      img = self.cache.get(self.pdf_hash, i, self.dpi, self.size)
+      if img is not None:
+        return img
+    img = convert_from_path(self.pdffile, size=self.size, dpi=self.dpi, first_page=i+1, last_page=i+1)[0]
+    if self.cache is not None:
+      self.cache.put(self.pdf_hash, i, self.dpi, self.size, img)
+    return img
+
+  def start(self, position=0):
+    # the current page and its successor are needed right away, everything
+    # else is rasterized in the background
+    self.load_start = time.monotonic()
+    self.position = position
+    for i in (position, position+1):
+      if 0 <= i < self.n_pages and self.pages[i] is None:
+        self.pages[i] = self.keep(i, self.render(i))
+    self.threads = [threading.Thread(target=self.run, daemon=True) for _ in range(self.workers)]
+    for t in self.threads:
+      t.start()
+
+  def next_index(self):
+    while self.urgent:
+      i = self.urgent.pop()
+      if self.pages[i] is None and i not in self.rendering and i not in self.failed:
+        return i
+    best = None
+    for i, page in enumerate(self.pages):
+      if page is None and i not in self.rendering and i not in self.failed:
+        # prefer pages ahead of the current one on ties
+        d = (abs(i - self.position), i < self.position)
+        if best is None or d < best[0]:
+          best = (d, i)
+    return best[1] if best is not None else None
+
+  def run(self):
+    while True:
+      with self.cond:
+        i = self.next_index()
+        if i is None:
+          # the last worker to finish reports
+          self.finished_workers += 1
+          if self.finished_workers < self.workers:
+            return
+          break
+        self.rendering.add(i)
+      try:
+        img = self.keep(i, self.render(i))
+      except Exception as e:
+        # whoever waits for the page renders it itself
+        print(f"could not rasterize page {i+1} of '{self.pdffile}': {e}")
+        with self.cond:
+          self.failed[i] = e
+          self.rendering.discard(i)
+          self.cond.notify_all()
+        continue
+      with self.cond:
+        self.pages[i] = img
+        self.rendering.discard(i)
+        self.cond.notify_all()
+    if self.cache is not None:
+      self.cache.evict()
+    self.load_duration = time.monotonic() - self.load_start
+    print(f"rasterized all {self.n_pages} pages of '{self.pdffile}' in {self.load_duration:.2f}s")
+
+
+def is_page_ready(pages, i):
+  if isinstance(pages, PageList):
+    return pages.is_ready(i)
+  return 0 <= i < len(pages)
+
+def open_pages(pdffile, dpi, size, config, position=0):
+  cache = page_cache_from_config(config)
+  workers = config.getint('SlideLoadWorkers', DEFAULT_LOAD_WORKERS)
+  store = page_store_from_config(config)
+  if config.getboolean('SlideLoadLazy', True):
+    pages = LazyPages(pdffile, dpi, size, cache, workers, store)
+    pages.start(position)
+    return pages
+  return load_pages(pdffile, dpi, size, cache, workers, store)
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import re
+import zipfile
+from pathlib import Path
+from xml.etree.ElementTree import iterparse
+
+DEFAULT_NOTES_CACHE_DIR = '~/.cache/presenting_and_recording/notes'
+
+P = '{http://schemas.openxmlformats.org/presentationml/2006/main}'
+A = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+SLIDE = re.compile(r'^ppt/slides/slide(\d+)\.xml$')
+NOTES_SLIDE = re.compile(r'^ppt/notesSlides/notesSlide\d+\.xml$')
+
+
+def file_hash(filename, chunk_size=1 << 20):
+  # the sha256 of a file, read in chunks. the caches of pdf pages use it too
+  h = hashlib.sha256()
+  with open(filename, 'rb') as f:
+    for chunk in iter(lambda: f.read(chunk_size), b''):
+      h.update(chunk)
+  return h.hexdigest()
+
+
+def slide_title(f):
+  # the text of the runs of the title placeholders, like
+  # //p:ph[@type='ctrTitle' or @type='title']/../../../p:txBody/a:p/a:r/a:t
+  stack = []
+  # depths of the open shapes that are titles. a shape's placeholder comes
+  # before its text
+  titles = set()
+  title = []
+  for event, elem in iterparse(f, ('start', 'end')):
+    if event == 'start':
+      titles.discard(len(stack))
+      stack.append(elem.tag)
+      continue
+    stack.pop()
+    depth = len(stack)
+    if elem.tag == P + 'ph' and elem.get('type') in ('ctrTitle', 'title') and depth >= 3:
+      titles.add(depth - 3)
+    elif elem.tag == A + 't' and depth - 4 in titles and stack[depth-3:] == [P + 'txBody', A + 'p', A + 'r']:
+      title.append(elem.text or '')
+  return ''.join(title)
+
+
+def slide_notes(f):
+  # returns the slide number of a notes slide, from its slide number field, and
+  # every paragraph with text, like //p:txBody//a:p[.//a:r//a:t]
+  stack = []
+  number = []
+  paragraphs = []
+  for event, elem in iterparse(f, ('start', 'end')):
+    if event == 'start':
+      stack.append(elem.tag)
+      continue
+    stack.pop()
+    if elem.tag == A + 'fld' and elem.get('type') == 'slidenum':
+      number.append(''.join(elem.itertext()))
+    elif elem.tag == A + 'p' and P + 'txBody' in stack and elem.find(f'.//{A}r//{A}t') is not None:
+      paragraphs.append(''.join(elem.itertext()).strip())
+  return re.sub(r'\s', '', ''.join(number)), paragraphs
+
+
+def extract_notes(pptx):
+  # returns the titles and the notes of a pptx by slide number, reading it once
+  titles = {}
+  notes = {}
+  with zipfile.ZipFile(pptx) as z:
+    for name in z.namelist():
+      m = SLIDE.match(name)
+      if m:
+        with z.open(name) as f:
+          titles[int(m.group(1))] = slide_title(f)
+      elif NOTES_SLIDE.match(name):
+        with z.open(name) as f:
+          number, paragraphs = slide_notes(f)
+        if number.isdigit():
+          notes[int(number)] = paragraphs
+  return titles, notes
+
+
+def format_notes(titles, notes):
+  # the notes file of every slide, in the format load_notes_and_titles reads
+  out = []
+  for k in sorted(titles):
+    out.append(f"#{k:02d}\n")
+    if titles[k]:
+      out.append(f"#title: {titles[k]}\n")
+    out.append(''.join(f"\n{p}" for p in notes.get(k, [])) + "\n\n\n")
+  return ''.join(out)
+
+
+class NotesCache():
+  # notes files extracted from pptx files, by the hash of the pptx
+
+  def __init__(self, cache_dir=DEFAULT_NOTES_CACHE_DIR):
+    self.cache_dir = Path(cache_dir).expanduser()
+    self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+  def path(self, pptx_hash):
+    return self.cache_dir / f"{pptx_hash}.notes"
+
+  def get(self, pptx_hash):
+    try:
+      return self.path(pptx_hash).read_text()
+    except FileNotFoundError:
+      return None
+
+  def put(self, pptx_hash, text):
+    p = self.path(pptx_hash)
+    tmp = p.with_suffix('.tmp')
+    tmp.write_text(text)
+    os.replace(tmp, p)
+
+
+def notes_cache_from_config(config):
+  if not config.getboolean('NotesCache', True):
+    return None
+  return NotesCache(config.get('NotesCacheDir', DEFAULT_NOTES_CACHE_DIR))
+
+
+def write_notes(pptx, outfile, cache=None):
+  # writes the notes file of a pptx, extracting it only if the cache doesn't
+  # have it yet
+  text = None
+  if cache is not None:
+    pptx_hash = file_hash(pptx)
+    text = cache.get(pptx_hash)
+  if text is None:
+    text = format_notes(*extract_notes(pptx))
+    if cache is not None:
+      cache.put(pptx_hash, text)
+  with open(outfile, 'w') as f:
+    f.write(text)
@@ -7,10 +7,9 @@ from tkinterhtml import HtmlFrame
 from tkinter import ttk
 import markdown
 from PIL import Image,ImageTk,ImageDraw
-from PIL.Image import Resampling
-from pdf2image import convert_from_path
 from pathlib import Path
 import os
+import sys
 import signal
 import re
 import time
@@ -19,6 +18,8 @@ import subprocess
 import configparser
 from datetime import datetime, timedelta
 from tempfile import TemporaryDirectory,NamedTemporaryFile
+from collections import OrderedDict
+from io import BytesIO
 
 from abc import abstractmethod
 
@@ -26,8 +27,14 @@ from string import Template
 
 import unicodedata
 
-REC_TIMING_MARKER_END = 'END'
-REC_TIMING_MARKER_SPECIAL = 'X'
+from pdfpages import open_pages, is_page_ready, pyramid_of, build_atlas, LazyPages
+from notesfile import NotesFile, FileWatcher
+from pptxnotes import write_notes, notes_cache_from_config
+from timeline import timing_journal_from_config, recover_timing_journal, read_timeline, parse_ms, format_ms, MARKER_END, MARKER_SPECIAL
+from mediatools import segment_file, source_rate, segment_cache_from_config, job_scheduler_from_config, build_manifest_from_config, execute_job, threads_args, ProductionProgress, format_progress, print_progress, RecorderStartMonitor, media_probe_from_config, RecordingSegments, capture_transcoder_from_config
+
+REC_TIMING_MARKER_END = MARKER_END
+REC_TIMING_MARKER_SPECIAL = MARKER_SPECIAL
 
 DEFAULT_CONFIG_FILE = '~/.presenting_and_recording.config'
 
@@ -39,6 +46,62 @@ def make_dummy_image(width, height, marked=True):
     draw.line((0,height, width, 0), fill=128, width=3)
   return ImageTk.PhotoImage(img)
 
+class ScaledImageCache():
+  # scaled Tk images of slides, keyed by slide and target size. the least recently
+  # used images are dropped once they exceed the memory budget. a Tk photo image
+  # holds 4 bytes per pixel
+  
+  def __init__(self, pages, max_size_mb=256):
+    self.pages = pages
+    self.max_size = int(max_size_mb * 1024 * 1024)
+    self.size = 0
+    self.images = OrderedDict()
+  
+  def get(self, i, size):
+    key = (i, size)
+    if key in self.images:
+      self.images.move_to_end(key)
+      return self.images[key]
+    im = ImageTk.PhotoImage(pyramid_of(self.pages, i).thumbnail(size))
+    self.images[key] = im
+    self.size += im.width() * im.height() * 4
+    while self.size > self.max_size and len(self.images) > 1:
+      _, old = self.images.popitem(last=False)
+      self.size -= old.width() * old.height() * 4
+    return im
+  
+  def prefetch(self, indices, size):
+    # never waits for pages that are still being rasterized
+    for i in indices:
+      if is_page_ready(self.pages, i):
+        self.get(i, size)
+
+class LatencyProbe():
+  # the time from changing the slide to the slide being painted, over the whole
+  # session. painted() is meant to run once Tk is idle again, after the canvases
+  # redrew
+  
+  def __init__(self):
+    self.samples = []
+    self.changed = None
+  
+  def change(self):
+    if self.changed is None:
+      self.changed = time.monotonic()
+  
+  def painted(self):
+    if self.changed is not None:
+      self.samples.append(time.monotonic() - self.changed)
+      self.changed = None
+  
+  def summary(self):
+    if not self.samples:
+      return None
+    samples = sorted(self.samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return (f"slide change latency over {len(samples)} changes: p50 {pick(.5):.0f}ms, p90 {pick(.9):.0f}ms, "
+            f"p99 {pick(.99):.0f}ms, max {samples[-1] * 1000:.0f}ms")
+
 class MediaProducer():
     
   def __init__(self, config, rec_basename, rec_basepath, pages, rec_timing_markers, 
@@ -58,38 +121,24 @@ class MediaProducer():
     self.rec_screencast_offset = rec_screencast_offset
     self.rec_stdout = rec_stdout
     self.rec_audio_compress = self.config.getboolean("RecordProduceCompressAudio", True)
+    self.scheduler = None
+    self.manifest = build_manifest_from_config(self.config, Path(self.rec_basepath, self.rec_basename+'-manifest.json'))
+    self.probe = media_probe_from_config(self.config)
+    self.progress = ProductionProgress(self.show_progress, self.probe)
+    self.progress_popup = None
+    self.progress_printed = False
+    self.segments_joined = False
+    # jobs that failed while running without a scheduler
+    self.failed_jobs = set()
     
     if 'RecordProduceAdditionalWebcamOffset' in self.config:
       add_webcam_offset = self.config.get('RecordProduceAdditionalWebcamOffset')
       self.rec_webcam_offset = self.sum_timecodes(self.rec_webcam_offset, add_webcam_offset)
       
   def sum_timecodes(self,t1, t2):
-    t1 = t1.split(':')
-    t2 = t2.split(':')
-    
-    t1_ms = int(t1[2].split('.')[1])
-    t2_ms = int(t2[2].split('.')[1])
-    t1_s = int(t1[2].split('.')[0])
-    t2_s = int(t2[2].split('.')[0])
-    t1_m = int(t1[1])
-    t2_m = int(t2[1])
-    t1_h = int(t1[0])
-    t2_h = int(t2[0])
-    
-    ms = t1_ms + t2_ms
-    sec = 0
-    if ms > 1000:
-      sec += 1
-      ms -= 1000
-    
-    outsec = (sec + t1_s + t2_s) % 60
-    mins = t1_m + t2_m + ((sec + t1_s + t2_s) // 60)
-    outmins = (mins % 60)
-    hrs = t1_h + t2_h + (mins // 60)
-    
-    return f"{hrs:02}:{outmins:02}:{outsec:02}.{ms:03}"
-  
-  def join_video_audio(self, v, a, o, a_offset='00:00.00', v_offset='00:00.00', a_cut=False, v_cut=False, a_start='00:00.00', v_start='00:00.00'):
+    return format_ms(parse_ms(t1) + parse_ms(t2))
+  
+  def join_video_audio(self, v, a, o, a_offset='00:00.00', v_offset='00:00.00', a_cut=False, v_cut=False, a_start='00:00.00', v_start='00:00.00', deps=()):
     cmd = ['ffmpeg','-y','-itsoffset',v_offset,'-ss',v_start]
     if v_cut is not False:
       cmd.extend(['-t',v_cut])
@@ -102,21 +151,99 @@ class MediaProducer():
     else:
       cmd.extend(['-c:v','copy','-c:a','aac'])
     cmd.append(o)
-    if self.rec_stdout:
-      print(' '.join(cmd), file=self.rec_stdout)
-    else:
-      print(' '.join(cmd))
-    rec_joiner = subprocess.Popen(cmd, cwd=self.rec_basepath, stdout=subprocess.PIPE)
-    rec_joiner.communicate()
+    self.run_cmd(cmd, deps, duration=float(v_cut) if v_cut is not False else None)
     # ~ if a_start != '00:00.00' and v_start != '00:00.00':
       # ~ ext = Path(o).suffix
       # ~ rec_joiner = subprocess.Popen(['ffmpeg','-y','-i',o,'-start_at_zero','-map','0:v','-c:v','copy','-map','0:a','-c:a','copy','arg'+ext], cwd=self.rec_basepath, stdout=subprocess.PIPE)
       # ~ rec_joiner.communicate()
   
-  def overlay_video(self, v1, v2, o, v2_offset='00:00.00'):
-    w,h = self.get_width_and_height_from_video(v2)
+  def log_cmd(self, cmd):
+    if self.rec_stdout:
+      print(' '.join(cmd), file=self.rec_stdout)
+    else:
+      print(' '.join(cmd))
+  
+  def run_cmd(self, cmd, deps=(), **options):
+    # with a scheduler, the command runs later as a job named after its output
+    # file, once the jobs producing deps are done
+    self.run_job(cmd[-1], cmd, deps, **options)
+  
+  def run_job(self, name, job, deps=(), **options):
+    # a function job is called with the number of threads it may use, None means
+    # no limit, and returns whether it succeeded. options are passed on to
+    # execute_job. like with a scheduler, jobs whose dependencies failed are skipped
+    if self.scheduler is not None:
+      self.scheduler.add(name, job, deps, **options)
+    elif any(d in self.failed_jobs for d in deps):
+      print(f"{name}: skipped, {', '.join(d for d in deps if d in self.failed_jobs)} failed")
+      self.failed_jobs.add(name)
+    elif execute_job(name, job, None, self.rec_basepath, self.log_cmd, self.manifest, self.progress, **options) is False:
+      self.failed_jobs.add(name)
+  
+  def start_jobs(self):
+    self.scheduler = job_scheduler_from_config(self.config, self.rec_basepath, self.log_cmd, self.manifest, self.progress)
+  
+  def run_jobs(self):
+    if self.scheduler is not None:
+      self.scheduler.run()
+      self.scheduler = None
+  
+  def step_done(self, message):
+    # scheduled steps haven't run yet
+    if self.scheduler is None:
+      self.showinfo("Done", message)
+  
+  def show_progress(self, snapshot):
+    if self.rootwindow is None:
+      print_progress(snapshot)
+      self.progress_printed = True
+      return
+    if self.progress_popup is None:
+      self.progress_popup = ProductionProgressPopup(self.rootwindow)
+    self.progress_popup.show(snapshot)
+    self.rootwindow.update()
+  
+  def end_progress(self):
+    # closes the progress display and writes the timing of every step so far
+    if self.progress_popup is not None:
+      self.progress_popup.close()
+      self.progress_popup = None
+    if self.progress_printed:
+      print(file=sys.stderr)
+      self.progress_printed = False
+    report = Path(self.rec_basepath, self.rec_basename+'-production.json')
+    self.progress.write_report(report)
+    print(f"timing of the production steps written to '{report}'")
+  
+  def join_recording_segments(self):
+    # a paused recording consists of segments. before anything is produced, every
+    # stream's segments are joined without re-encoding into the file an unpaused
+    # recording would have written, so the rest of the production and the offsets
+    # stay the same
+    if self.segments_joined:
+      return
+    self.segments_joined = True
+    segments = RecordingSegments(Path(self.rec_basepath, self.rec_basename+'-segments.json'))
+    if not segments.segments:
+      return
+    for name, filename in segments.streams.items():
+      files = segments.files(name)
+      listing = segments.concat_list(name, lambda f: self.probe.start_time(f, self.rec_basepath))
+      listfile = f"{self.rec_basename}-{name}-segments.ffconcat"
+      with open(Path(self.rec_basepath, listfile), 'w') as f:
+        f.write(listing)
+      cmd = ['ffmpeg','-y','-f','concat','-safe','0','-i',listfile,'-map','0','-c','copy',filename]
+      # the segments run one after another, the other steps need the joined files
+      execute_job(filename, cmd, None, self.rec_basepath, self.log_cmd, self.manifest, self.progress,
+                  inputs=files, params=listing)
+  
+  def overlay_video(self, v1, v2, o, v2_offset='00:00.00', deps=(), probe=None):
+    # probe is a file with the same video stream as v2, in case v2 is produced
+    # by a job that didn't run yet
+    probe = probe or v2
+    w,h = self.probe.width_and_height(probe, self.rec_basepath)
     
-    framerate = self.get_framerate_from_file(v2)
+    framerate = self.probe.framerate(probe, self.rec_basepath)
     framerate = str(framerate) if framerate else '25'
     
     frac = self.config.get("RecordProduceScreencastOverlayFractionWebcam", "6")
@@ -125,37 +252,12 @@ class MediaProducer():
     
     filter_complex = f"[1:v][0:v]scale2ref=({w}/{h})*ih/{frac}/sar:ih/{frac}[wm][base];[base][wm]overlay={xpos}:{ypos}"
     cmd = ['ffmpeg', '-y', '-i', v1, '-itsoffset',v2_offset, '-i', v2, '-filter_complex', filter_complex, '-r', framerate, '-c:a', 'copy', o]
-    if self.rec_stdout:
-      print(' '.join(cmd), file=self.rec_stdout)
-    else:
-      print(' '.join(cmd))
-    rec_joiner = subprocess.Popen(cmd, cwd=self.rec_basepath, stdout=subprocess.PIPE)
-    rec_joiner.communicate()
-  
-  def get_framerate_from_file(self, filename):
-    cmd = 'ffprobe -v error -select_streams v -of default=noprint_wrappers=1:nokey=1 -show_entries stream=r_frame_rate '+filename
-    result = subprocess.run(cmd.split(' '), stdout=subprocess.PIPE)
-    result = result.stdout.decode('utf-8').strip()
-    if result:
-      if '/' in result:
-        for char in result:
-          if char not in '0123456789+-*(). /':
-            return None
-        fps = eval(result, {"__builtins__":None}, {})
-        return round(float(fps))
-    else:
-      return None
-      
-  def get_width_and_height_from_video(self, filename):
-    cmd = 'ffprobe -v error -select_streams v:0 -show_entries stream=width,height -of csv=p=0 '+filename
-    result = subprocess.run(cmd.split(' '), stdout=subprocess.PIPE)
-    result = result.stdout.decode('utf-8').strip().split(',')
-    return (result[0], result[1])
-    
-  def overlay_video_with_intro_maybe_outro(self, v1, v2, a, png, o, v2_offset='00:00.00'):
-    w,h = self.get_width_and_height_from_video(v2)
+    self.run_cmd(cmd, deps)
+  
+  def overlay_video_with_intro_maybe_outro(self, v1, v2, a, png, o, v2_offset='00:00.00', deps=()):
+    w,h = self.probe.width_and_height(v2, self.rec_basepath)
     
-    framerate = self.get_framerate_from_file(v2)
+    framerate = self.probe.framerate(v2, self.rec_basepath)
     framerate = str(framerate) if framerate else '30'
 
     intro_duration = self.config.get("RecordProduceScreencastOverlayIntroDuration", "3")
@@ -172,12 +274,7 @@ class MediaProducer():
       filter_complex = f"[2:v][1:v]scale2ref=({w}/{h})*ih/{frac}/sar:ih/{frac}[wm][base];[base][wm]overlay={xpos}:{ypos}[main];[0][4][main][3][5][4]concat=n=3:v=1:a=1[v][a]"
       cmd.extend(['-loop','1','-t',outro_duration,'-i', outro])
     cmd.extend(['-filter_complex', filter_complex, '-r', framerate, '-map', '[v]','-map', '[a]', o])
-    if self.rec_stdout:
-      print(' '.join(cmd), file=self.rec_stdout)
-    else:
-      print(' '.join(cmd))
-    rec_joiner = subprocess.Popen(cmd, cwd=self.rec_basepath, stdout=subprocess.PIPE)
-    rec_joiner.communicate()
+    self.run_cmd(cmd, deps)
   
   def askyesno(self, title, message, default=None):
     if self.rootwindow is not None:
@@ -238,49 +335,328 @@ class MediaProducer():
     else:
       return self.config.getboolean("RecordProduceEverything")
   
+  def wants(self, just_everything, key, title, message):
+    # a product is made if everything is, or the config or the user want it
+    return just_everything or ( key not in self.config and self.askyesno(title, message, default=mb.YES)) or self.config.getboolean(key)
+  
   def produce_webcam(self, just_everything):
     if self.get_record_webcam:
-      if just_everything or ( 'RecordProduceWebcamPlusAudio' not in self.config and self.askyesno("Join video and audio?", "Do you want to join webcam video and audio?", default=mb.YES)) or self.config.getboolean('RecordProduceWebcamPlusAudio'):
+      if self.wants(just_everything, 'RecordProduceWebcamPlusAudio', "Join video and audio?", "Do you want to join webcam video and audio?"):
         self.join_video_audio(self.rec_basename+'-webcam.mkv', self.rec_basename+'-audio.flac', self.rec_basename+'-webcam-audio.mkv', v_offset='-'+self.rec_webcam_offset, a_offset='-'+self.rec_audio_offset)
         if not just_everything:
-          self.showinfo("Done","Merging audio and video is done")
+          self.step_done("Merging audio and video is done")
         return True
     return False
   
+  def plan_screencast_products(self, just_everything):
+    # asks for everything produce_screencast would produce step by step
+    products = []
+    if self.wants(just_everything, 'RecordProduceScreencastPlusAudio', "Join video and audio?", "Do you want to join screencast and audio now?"):
+      products.append('screencast-audio')
+    if self.get_record_webcam:
+      if self.wants(just_everything, 'RecordProduceWebcamPlusAudio', "Join video and audio?", "Do you want to join webcam video and audio?"):
+        products.append('webcam-audio')
+      if self.wants(just_everything, 'RecordProduceScreencastOverlay', "Overlay videos?", "Do you want to overlay the screencast and webcam video now?"):
+        products.append('overlay')
+      if Path(self.rec_basename+'-title.png').exists() and self.wants(just_everything, 'RecordProduceScreencastOverlayWithTitle', "Found a title-png!", "Do you want to produce overlayed screencast with intro now?"):
+        products.append('overlay-title')
+    return products
+  
+  def fused_screencast_cmd(self, products, infile_suffix='-screencast.mkv'):
+    # one ffmpeg invocation for the products that opens and decodes every source
+    # once. the joined files copy the video, the overlays share the screencast and
+    # the scaled webcam. the offsets every product's own step applies with
+    # -itsoffset are applied in the graph instead, relative to the video the
+    # product is timed by. the audio is re-encoded for the joined files, as flac
+    # if it isn't compressed
+    base = self.rec_basename
+    webcam_offset = parse_ms(self.rec_webcam_offset) / 1000
+    audio_offset = parse_ms(self.rec_audio_offset) / 1000
+    overlays = [p for p in ('overlay', 'overlay-title') if p in products]
+    inputs = []
+    def add_input(*args):
+      inputs.append(list(args))
+      return len(inputs) - 1
+    filters = []
+    outputs = []
+    acodec = ['-c:a','aac'] if self.rec_audio_compress else ['-c:a','flac']
+    
+    def shift(src, seconds, dst, audio=False):
+      # moves a stream later, or earlier cutting off what would start before 0
+      if seconds > 0:
+        f = f"adelay={round(seconds * 1000)}:all=1" if audio else f"setpts=PTS+{seconds:.3f}/TB"
+      elif seconds < 0:
+        f = f"atrim=start={-seconds:.3f},asetpts=PTS-STARTPTS" if audio else f"trim=start={-seconds:.3f},setpts=PTS-STARTPTS"
+      else:
+        f = "anull" if audio else "null"
+      filters.append(f"[{src}]{f}[{dst}]")
+    
+    def fan_out(src, shifts, name, audio=False):
+      # a copy of src for every shift, labelled name0, name1, ...
+      if len(shifts) == 1:
+        shift(src, shifts[0], f"{name}0", audio)
+        return
+      labels = [f"{name}{k}" if seconds == 0 else f"{name}in{k}" for k, seconds in enumerate(shifts)]
+      filters.append(f"[{src}]{'asplit' if audio else 'split'}={len(shifts)}" + ''.join(f"[{label}]" for label in labels))
+      for k, seconds in enumerate(shifts):
+        if seconds != 0:
+          shift(labels[k], seconds, f"{name}{k}", audio)
+    
+    screen = add_input('-i', base+infile_suffix) if 'screencast-audio' in products or overlays else None
+    webcam = add_input('-i', base+'-webcam.mkv') if 'webcam-audio' in products or overlays else None
+    audio = add_input('-i', base+'-audio.flac')
+    # the audio of every product relative to its video
+    audio_shifts = []
+    
+    # as join_video_audio times them
+    if 'screencast-audio' in products:
+      outputs += ['-map', f'{screen}:v', '-map', f'[a{len(audio_shifts)}]', '-c:v', 'copy'] + acodec + [base+'-screencast-audio.mkv']
+      audio_shifts.append(0)
+    if 'webcam-audio' in products:
+      # the webcam and the audio both start with the recording
+      outputs += ['-map', f'{webcam}:v', '-map', f'[a{len(audio_shifts)}]', '-c:v', 'copy'] + acodec + [base+'-webcam-audio.mkv']
+      audio_shifts.append(webcam_offset - audio_offset)
+    
+    if overlays:
+      w,h = self.probe.width_and_height(base+'-webcam.mkv', self.rec_basepath)
+      frac = self.config.get("RecordProduceScreencastOverlayFractionWebcam", "6")
+      xpos = self.config.get("RecordProduceScreencastOverlayPositionWebcamX", "10")
+      ypos = self.config.get("RecordProduceScreencastOverlayPositionWebcamY", "10")
+      filters.append(f"[{webcam}:v][{screen}:v]scale2ref=({w}/{h})*ih/{frac}/sar:ih/{frac}[wm][screen]")
+      fan_out('screen', [0] * len(overlays), 'base')
+      # overlay_video moves -webcam-audio.mkv by the webcam offset once more,
+      # overlay_video_with_intro_maybe_outro reads the webcam like the join
+      fan_out('wm', [-2 * webcam_offset if p == 'overlay' else -webcam_offset for p in overlays], 'cam')
+      for k, p in enumerate(overlays):
+        filters.append(f"[base{k}][cam{k}]overlay={xpos}:{ypos}[main{k}]")
+    
+    # as overlay_video times it
+    if 'overlay' in products:
+      k = overlays.index('overlay')
+      framerate = self.probe.framerate(base+'-webcam.mkv', self.rec_basepath)
+      framerate = str(framerate) if framerate else '25'
+      outputs += ['-map', f'[main{k}]', '-map', f'[a{len(audio_shifts)}]', '-r', framerate] + acodec + [base+'-screencast_overlayed.mp4']
+      audio_shifts.append(-webcam_offset - audio_offset)
+    # as overlay_video_with_intro_maybe_outro times it
+    if 'overlay-title' in products:
+      k = overlays.index('overlay-title')
+      framerate = self.probe.framerate(base+'-webcam.mkv', self.rec_basepath)
+      framerate = str(framerate) if framerate else '30'
+      intro_duration = self.config.get("RecordProduceScreencastOverlayIntroDuration", "3")
+      title = add_input('-framerate', framerate, '-loop', '1', '-t', intro_duration, '-i', base+'-title.png')
+      silence = add_input('-f', 'lavfi', '-t', '0.1', '-i', 'anullsrc')
+      chain = f"[{title}:v][{silence}:a][main{k}][a{len(audio_shifts)}]"
+      audio_shifts.append(0)
+      if 'RecordProduceScreencastOverlayOutroImg' not in self.config:
+        chain += "concat=n=2:v=1:a=1[v][a]"
+      else:
+        outro_duration = self.config.get("RecordProduceScreencastOverlayOutroDuration", "3")
+        outro = add_input('-loop', '1', '-t', outro_duration, '-i', self.config.get("RecordProduceScreencastOverlayOutroImg"))
+        chain += f"[{outro}:v][{silence}:a]concat=n=3:v=1:a=1[v][a]"
+      filters.append(chain)
+      outputs += ['-map', '[v]', '-map', '[a]', '-r', framerate, base+'-screencast_overlayed_title.mp4']
+    
+    fan_out(f'{audio}:a', audio_shifts, 'a', audio=True)
+    cmd = ['ffmpeg', '-y'] + [arg for args in inputs for arg in args]
+    return cmd + ['-filter_complex', ';'.join(filters)] + outputs
+  
+  def produce_screencast_fused(self, products, infile_suffix='-screencast.mkv'):
+    suffixes = {'screencast-audio': '-screencast-audio.mkv', 'webcam-audio': '-webcam-audio.mkv',
+                'overlay': '-screencast_overlayed.mp4', 'overlay-title': '-screencast_overlayed_title.mp4'}
+    cmd = self.fused_screencast_cmd(products, infile_suffix)
+    self.run_cmd(cmd, outputs=[self.rec_basename+suffixes[p] for p in products])
+  
   def produce_screencast(self, rootwindow, infile_suffix='-screencast.mkv'):
     self.rootwindow = rootwindow
     just_everything = self.ask_just_everything()
     if just_everything is None:
       return
+    self.join_recording_segments()
+    
+    if self.config.getboolean('RecordProduceFused', False):
+      products = self.plan_screencast_products(just_everything)
+      if products:
+        self.produce_screencast_fused(products, infile_suffix)
+      self.end_progress()
+      self.showinfo("Done", "All files produced")
+      return
     
-    if just_everything or ( 'RecordProduceScreencastPlusAudio' not in self.config and self.askyesno("Join video and audio?", "Do you want to join screencast and audio now?", default=mb.YES)) or self.config.getboolean('RecordProduceScreencastPlusAudio'):
+    self.start_jobs()
+    if self.wants(just_everything, 'RecordProduceScreencastPlusAudio', "Join video and audio?", "Do you want to join screencast and audio now?"):
       self.join_video_audio(self.rec_basename+infile_suffix, self.rec_basename+'-audio.flac', self.rec_basename+'-screencast-audio.mkv')
       if not just_everything:
-        self.showinfo("Done","Merging audio and video is done")
+        self.step_done("Merging audio and video is done")
     
     self.produce_webcam(just_everything)
     if self.get_record_webcam:    
-      if just_everything or ( 'RecordProduceScreencastOverlay' not in self.config and self.askyesno("Overlay videos?", "Do you want to overlay the screencast and webcam video now?", default=mb.YES)) or self.config.getboolean('RecordProduceScreencastOverlay'):
-        self.overlay_video(self.rec_basename+infile_suffix, self.rec_basename+'-webcam-audio.mkv', self.rec_basename+'-screencast_overlayed.mp4', v2_offset='-'+self.rec_webcam_offset)
+      if self.wants(just_everything, 'RecordProduceScreencastOverlay', "Overlay videos?", "Do you want to overlay the screencast and webcam video now?"):
+        self.overlay_video(self.rec_basename+infile_suffix, self.rec_basename+'-webcam-audio.mkv', self.rec_basename+'-screencast_overlayed.mp4', v2_offset='-'+self.rec_webcam_offset,
+                           deps=[self.rec_basename+'-webcam-audio.mkv'], probe=self.rec_basename+'-webcam.mkv')
         if not just_everything:
-          self.showinfo("Done","Video overlay is done")
+          self.step_done("Video overlay is done")
       
-      if Path(self.rec_basename+'-title.png').exists() and (just_everything or ( 'RecordProduceScreencastOverlayWithTitle' not in self.config and self.askyesno("Found a title-png!", "Do you want to produce overlayed screencast with intro now?", default=mb.YES)) or self.config.getboolean('RecordProduceScreencastOverlayWithTitle')):
+      if Path(self.rec_basename+'-title.png').exists() and self.wants(just_everything, 'RecordProduceScreencastOverlayWithTitle', "Found a title-png!", "Do you want to produce overlayed screencast with intro now?"):
         self.overlay_video_with_intro_maybe_outro(self.rec_basename+infile_suffix, self.rec_basename+'-webcam.mkv', self.rec_basename+'-audio.flac', self.rec_basename+'-title.png', self.rec_basename+'-screencast_overlayed_title.mp4', v2_offset='-'+self.rec_webcam_offset)
         
         # ~ if not just_everything:
           # ~ mb.showinfo("Done","Video overlay with intro is done")
     
+    self.run_jobs()
+    self.end_progress()
     self.showinfo("Done", "All files produced")
     
+  def produce_slideshow_png(self, geom, threads=None):
+    # only slides that show up in the timing file are written, each one once
+    used = {slide for slide, _, _ in self.slideshow_entries()}
+    with TemporaryDirectory() as tmpdir:
+      w=0
+      h=0
+      for i in sorted(used):
+        if i >= len(self.pages):
+          continue
+        page = pyramid_of(self.pages, i)
+        fname = '{}/slide-{:03d}.png'.format(tmpdir,i)
+        h = geom[1]
+        w = geom[0] if geom[0] is not None else int(round(h * page.size[0] / page.size[1]))
+        img = page.resize((w,h))
+        img.save(fname, 'png', compress_level=6)
+      if any(i >= len(self.pages) for i in used):
+        if w == 0:
+          page = pyramid_of(self.pages, 0)
+          h = geom[1]
+          w = geom[0] if geom[0] is not None else int(round(h * page.size[0] / page.size[1]))
+        fname = '{}/slide-{:03d}.png'.format(tmpdir,len(self.pages))
+        img = Image.new('RGB', (w,h), (0,0,0))
+        img.save(fname, 'png', compress_level=9)
+      timeline = read_timeline(Path(self.rec_basepath, self.rec_timing_file))
+      with NamedTemporaryFile('w', suffix='.ffconcat') as tmpfile: 
+        print(timeline.ffconcat('{}/slide-{{:03d}}.png'.format(tmpdir)), file=tmpfile, flush=True)
+        ts = str(math.floor(self.rec_timing_markers[-1].total_seconds()))
+        cmd = ['ffmpeg','-y','-safe','0','-f','concat','-i',tmpfile.name,'-t',ts,'-c:v','libx264','-vf','format=yuv420p,fps=4','-fflags','+genpts','-movflags','+faststart']+threads_args(threads)+[self.rec_basename+'-screen.mp4']
+        # ~ cmd = ['ffmpeg','-y','-safe','0','-f','concat','-i',tmpfile.name,'-c:v','libx264','-vf','format=yuv420p','-fflags','+genpts','-movflags','+faststart',self.rec_basename+'-screen.mp4']
+        rec_producer = subprocess.Popen(cmd, cwd=self.rec_basepath)
+        rec_producer.communicate()
+        return rec_producer.returncode == 0
+  
+  def slideshow_entries(self):
+    # (slide, start, end) in seconds for every slide shown during the recording,
+    # like chap2ffconcat sees them: special markers are skipped and every entry
+    # lasts until the next slide change
+    timeline = read_timeline(Path(self.rec_basepath, self.rec_timing_file))
+    return [(slide, start / 1000, end / 1000) for slide, start, end in timeline.entries()]
+  
+  def slideshow_frame(self, slide, geom):
+    # slides after the last page show a black screen
+    if slide >= len(self.pages):
+      return Image.new('RGB', geom, (0,0,0)).tobytes()
+    return pyramid_of(self.pages, slide).resize(geom).tobytes()
+  
+  def slideshow_geom(self, geom):
+    # yuv420p needs even dimensions
+    w, h = geom
+    if w is None:
+      page = pyramid_of(self.pages, 0)
+      w = int(round(h * page.size[0] / page.size[1]))
+    return w - w % 2, h - h % 2
+  
+  def produce_slideshow_pipe(self, geom, fps=4, threads=None):
+    # raw frames are piped into ffmpeg, no png is encoded or decoded. rawvideo
+    # has a constant frame rate, so every slide's frame is repeated at the output
+    # frame rate until the next slide change
+    w, h = self.slideshow_geom(geom)
+    entries = self.slideshow_entries()
+    ts = str(math.floor(self.rec_timing_markers[-1].total_seconds()))
+    cmd = ['ffmpeg','-y','-f','rawvideo','-pix_fmt','rgb24','-s',f'{w}x{h}','-framerate',str(fps),'-i','pipe:0',
+           '-t',ts,'-c:v','libx264','-vf','format=yuv420p','-movflags','+faststart']+threads_args(threads)+[self.rec_basename+'-screen.mp4']
+    self.log_cmd(cmd)
+    rec_producer = subprocess.Popen(cmd, cwd=self.rec_basepath, stdin=subprocess.PIPE)
+    start = entries[0][1] if entries else 0
+    # every slide is rendered once and kept until its last appearance
+    last_use = {slide: k for k, (slide, _, _) in enumerate(entries)}
+    frames = {}
+    n_frames = 0
+    try:
+      for k, (slide, _, end) in enumerate(entries):
+        # frame boundaries follow the absolute times, so rounding doesn't add up
+        until = round((end - start) * fps)
+        if until > n_frames:
+          if slide not in frames:
+            frames[slide] = self.slideshow_frame(slide, (w, h))
+          frame = frames[slide]
+          for _ in range(until - n_frames):
+            rec_producer.stdin.write(frame)
+          n_frames = until
+        if last_use[slide] == k:
+          frames.pop(slide, None)
+    except BrokenPipeError:
+      # ffmpeg stops reading once it reached -t
+      pass
+    finally:
+      try:
+        rec_producer.stdin.close()
+      except BrokenPipeError:
+        pass
+    return rec_producer.wait() == 0
+  
+  def encode_still_segment(self, frame, geom, fps, length, out, threads=None):
+    cmd = ['ffmpeg','-y','-loglevel','error','-f','rawvideo','-pix_fmt','rgb24','-s','{}x{}'.format(*geom),'-framerate',str(fps),'-i','pipe:0',
+           '-c:v','libx264','-tune','stillimage','-bf','0','-pix_fmt','yuv420p','-f','mp4']+threads_args(threads)+[str(out)]
+    rec_producer = subprocess.Popen(cmd, cwd=self.rec_basepath, stdin=subprocess.PIPE)
+    try:
+      for _ in range(length * fps):
+        rec_producer.stdin.write(frame)
+      rec_producer.stdin.close()
+    except BrokenPipeError:
+      # ffmpeg quit, its exit code tells why
+      pass
+    return rec_producer.wait() == 0
+  
+  def produce_slideshow_segments(self, geom, fps=4, threads=None):
+    # every distinct slide is encoded once as a still segment of a fixed length
+    # and cached by its content. the slideshow then only concatenates segments
+    # without re-encoding: longer entries repeat the segment, the last repetition
+    # is cut with outpoint. without b-frames, cutting never breaks a reference
+    geom = self.slideshow_geom(geom)
+    length = self.config.getint('RecordProduceSlideshowSegmentLength', 60)
+    entries = self.slideshow_entries()
+    cache = segment_cache_from_config(self.config)
+    segments = {}
+    for slide in sorted({slide for slide, _, _ in entries}):
+      frame = self.slideshow_frame(slide, geom)
+      key = cache.key(frame, geom, fps, length)
+      segment = cache.get(key)
+      if segment is None:
+        segment = cache.put(key, lambda out: self.encode_still_segment(frame, geom, fps, length, out, threads))
+      segments[slide] = segment
+    cache.evict()
+    
+    lines = ["ffconcat version 1.0"]
+    for slide, start, end in entries:
+      remaining = round(end - start, 3)
+      while remaining > 0:
+        lines.append(f"file '{segments[slide]}'")
+        if remaining < length:
+          lines.append(f"outpoint {remaining:.3f}")
+        remaining = round(remaining - length, 3)
+    ts = str(math.floor(self.rec_timing_markers[-1].total_seconds()))
+    with NamedTemporaryFile('w', suffix='.ffconcat') as tmpfile:
+      print('\n'.join(lines), file=tmpfile, flush=True)
+      cmd = ['ffmpeg','-y','-safe','0','-f','concat','-i',tmpfile.name,'-t',ts,'-c','copy','-movflags','+faststart',self.rec_basename+'-screen.mp4']
+      self.log_cmd(cmd)
+      rec_producer = subprocess.Popen(cmd, cwd=self.rec_basepath)
+      rec_producer.communicate()
+      return rec_producer.returncode == 0
+  
   def produce_recording(self, rootwindow):
     self.rootwindow = rootwindow
     just_everything = self.ask_just_everything()
     if just_everything is None:
       return
+    self.join_recording_segments()
     
+    self.start_jobs()
     if not self.get_record_animated_slides:
-      if just_everything or ( 'RecordProduceSlideshow' not in self.config and self.askyesno("Recording finished", "Do you want to produce the slideshow file right away?", default=mb.YES)) or self.config.getboolean('RecordProduceSlideshow'):
+      if self.wants(just_everything, 'RecordProduceSlideshow', "Recording finished", "Do you want to produce the slideshow file right away?"):
         use_custom_geom = False
         p = None
         if 'RecordProduceCustomGeom' not in self.config:
@@ -303,51 +679,50 @@ class MediaProducer():
           print(f"{custom_w} X {custom_h}")
         
         if self.pages:
-          with TemporaryDirectory() as tmpdir:
-            i=0
-            w=0
-            h=0
-            for i,page in enumerate(self.pages):
-              fname = '{}/slide-{:03d}.png'.format(tmpdir,i)
-              if use_custom_geom:
-                h = custom_h
-                w = custom_w
-              else:
-                h = min(rootwindow.winfo_screenheight(), 1080)
-                w = int(round(h * page.width / page.height))
-              img = page.resize((w,h), Resampling.LANCZOS)
-              img.save(fname, 'png', compress_level=6)
-            fname = '{}/slide-{:03d}.png'.format(tmpdir,i+1)
-            img = ImageTk.getimage(make_dummy_image(w,h, marked=False))
-            img.save(fname, 'png', compress_level=9)
-            cmd = ["chap2ffconcat", self.rec_timing_file, '{}/slide-{{:03d}}.png'.format(tmpdir)]
-            with NamedTemporaryFile() as tmpfile: 
-              subprocess.run(cmd, stdout=tmpfile, cwd=self.rec_basepath)
-              ts = str(math.floor(self.rec_timing_markers[-1].total_seconds()))
-              cmd = ['ffmpeg','-y','-safe','0','-f','concat','-i',tmpfile.name,'-t',ts,'-c:v','libx264','-vf','format=yuv420p,fps=4','-fflags','+genpts','-movflags','+faststart',self.rec_basename+'-screen.mp4']
-              # ~ cmd = ['ffmpeg','-y','-safe','0','-f','concat','-i',tmpfile.name,'-c:v','libx264','-vf','format=yuv420p','-fflags','+genpts','-movflags','+faststart',self.rec_basename+'-screen.mp4']
-              rec_producer = subprocess.Popen(cmd, cwd=self.rec_basepath)
-              rec_producer.communicate()
+          if use_custom_geom:
+            geom = (custom_w, custom_h)
+          else:
+            geom = (None, min(rootwindow.winfo_screenheight(), 1080))
+          method = self.config.get('RecordProduceSlideshowMethod', 'segments')
+          if method == 'png':
+            produce = self.produce_slideshow_png
+          elif method == 'pipe':
+            produce = self.produce_slideshow_pipe
+          else:
+            produce = self.produce_slideshow_segments
+          # the slideshow is rebuilt when the timings, the pdf or the settings change
+          inputs = [self.rec_timing_file] + ([self.pages.source] if getattr(self.pages, 'source', None) else [])
+          params = {'method': method, 'geom': geom, 'pages': (len(self.pages), pyramid_of(self.pages, 0).size),
+                    'segment_length': self.config.getint('RecordProduceSlideshowSegmentLength', 60)}
+          self.run_job(self.rec_basename+'-screen.mp4', lambda threads, geom=geom: produce(geom, threads=threads), inputs=inputs, params=params)
             
 
-        if just_everything or ( 'RecordProduceSlidesPlusAudio' not in self.config and self.askyesno("Join video and audio?", "Do you want to join slideshow and audio now?", default=mb.YES)) or self.config.getboolean('RecordProduceSlidesPlusAudio'):
-          self.join_video_audio(self.rec_basename+'-screen.mp4', self.rec_basename+'-audio.flac', self.rec_basename+'-slides-audio.mkv', v_offset = self.rec_audio_offset)
+        if self.wants(just_everything, 'RecordProduceSlidesPlusAudio', "Join video and audio?", "Do you want to join slideshow and audio now?"):
+          self.join_video_audio(self.rec_basename+'-screen.mp4', self.rec_basename+'-audio.flac', self.rec_basename+'-slides-audio.mkv', v_offset = self.rec_audio_offset,
+                                deps=[self.rec_basename+'-screen.mp4'])
           if not just_everything:
-            self.showinfo("Done","Merging audio and video is done")
+            self.step_done("Merging audio and video is done")
       
-    elif just_everything or ( 'RecordProduceSlidesPlusAudio' not in self.config and self.askyesno("Join video and audio?", "Do you want to join slides-video and audio now?", default=mb.YES)) or self.config.getboolean('RecordProduceSlidesPlusAudio'):
+    elif self.wants(just_everything, 'RecordProduceSlidesPlusAudio', "Join video and audio?", "Do you want to join slides-video and audio now?"):
       ts = str(math.floor(self.rec_timing_markers[-1].total_seconds()))
       self.join_video_audio(self.rec_basename+'-screen.mkv', self.rec_basename+'-audio.flac', self.rec_basename+'-screen-audio.mkv', v_cut=ts)
       if not just_everything:
-        self.showinfo("Done","Merging audio and video is done")
+        self.step_done("Merging audio and video is done")
       
     self.produce_webcam(just_everything)
     
     geom = self.config.get("RecordTitleImageGeom", "960x540")
     geom = geom.partition('x')
-    img = self.pages[0].resize((int(geom[0]), int(geom[2])), Resampling.LANCZOS)
-    img.save(self.rec_basename+'-title.png', 'png', compress_level=1)
-    
+    img = pyramid_of(self.pages, 0).resize((int(geom[0]), int(geom[2])))
+    # an unchanged title keeps its modification time, so steps using it stay up to date
+    png = BytesIO()
+    img.save(png, 'png', compress_level=1)
+    title = Path(self.rec_basename+'-title.png')
+    if not title.exists() or title.read_bytes() != png.getvalue():
+      title.write_bytes(png.getvalue())
+    
+    self.run_jobs()
+    self.end_progress()
     self.showinfo("Done", "All files produced")    
 
 class DeltaTemplate(Template):
@@ -456,6 +831,79 @@ class inputGeomPopup(object):
     self.top.destroy()
 
 
+class ProductionProgressPopup(object):
+  # a bar for every running production job, with its speed and the estimated
+  # time left
+  def __init__(self,master):
+      top=self.top=tk.Toplevel(master)
+      self.top.title("Producing...")
+      self.rows={}
+  
+  def show(self, snapshot):
+    names = {entry['name'] for entry in snapshot}
+    for name in list(self.rows):
+      if name not in names:
+        for w in self.rows.pop(name):
+          w.destroy()
+    for entry in snapshot:
+      if entry['name'] not in self.rows:
+        l=tk.Label(self.top, anchor='w', width=60)
+        l.pack(fill='x', padx=5)
+        b=ttk.Progressbar(self.top, length=400, mode='determinate' if entry['duration'] else 'indeterminate')
+        b.pack(fill='x', padx=5, pady=(0,5))
+        self.rows[entry['name']] = (l, b)
+      l, b = self.rows[entry['name']]
+      l['text'] = format_progress(entry)
+      if entry['percent'] is not None:
+        b['value'] = entry['percent']
+      elif not entry['duration']:
+        b.step(2)
+  
+  def close(self):
+    self.top.destroy()
+
+
+class SlideOverview(object):
+  # a grid of all slides to jump to. the thumbnails are packed into a single
+  # atlas image, so there's only one Tk image no matter how long the deck is
+  def __init__(self, master, controller, atlas, cell, cols, pad=8):
+      top=self.top=tk.Toplevel(master)
+      self.top.wm_title("Slide Overview")
+      self.controller = controller
+      self.cell = cell
+      self.cols = cols
+      self.pad = pad
+      
+      self.cv = tk.Canvas(top, width=min(atlas.width(), master.winfo_screenwidth()-100),
+                          height=min(atlas.height(), master.winfo_screenheight()-200),
+                          scrollregion=(0, 0, atlas.width(), atlas.height()), highlightthickness=0)
+      scroll = tk.Scrollbar(top, orient=tk.VERTICAL, command=self.cv.yview)
+      self.cv.configure(yscrollcommand=scroll.set)
+      self.cv.grid(column=0, row=0, sticky='NSWE')
+      scroll.grid(column=1, row=0, sticky='NS')
+      top.columnconfigure(0, weight=1)
+      top.rowconfigure(0, weight=1)
+      
+      self.cv.create_image(0, 0, anchor=tk.NW, image=atlas)
+      x, y = self.cell_origin(controller.counter)
+      self.cv.create_rectangle(x-3, y-3, x+cell[0]+2, y+cell[1]+2, outline='#FF0000', width=3)
+      self.cv.yview_moveto(max(0, y - cell[1]) / atlas.height())
+      
+      self.cv.bind('<Button-1>', self.callback)
+      self.top.bind('<Escape>', lambda event: self.top.destroy())
+  
+  def cell_origin(self, i):
+    return (self.pad + (i % self.cols) * (self.cell[0] + self.pad),
+            self.pad + (i // self.cols) * (self.cell[1] + self.pad))
+  
+  def callback(self, event):
+    col = int(self.cv.canvasx(event.x) - self.pad // 2) // (self.cell[0] + self.pad)
+    row = int(self.cv.canvasy(event.y) - self.pad // 2) // (self.cell[1] + self.pad)
+    if 0 <= col < self.cols:
+      self.controller.goto_block(row * self.cols + col)
+      self.top.destroy()
+
+
 class BaseRecorder(tk.Frame):
 
   def __init__(self, parent, project_name, *args, **kwargs):
@@ -471,8 +919,26 @@ class BaseRecorder(tk.Frame):
     self.root.protocol("WM_DELETE_WINDOW", self.close_window)
     
     self.rec_recorder = None
+    self.rec_monitor = None
+    self.rec_cmd = None
+    self.rec_outputs = {}
+    # the transcoders of the running capture by stream, and those still
+    # compressing the rest of a capture that ended
+    self.rec_transcoders = {}
+    self.rec_finishing = []
+    self.rec_after_transcoding = None
+    self.rec_is_stopping = False
+    self.rec_segments = None
+    self.rec_segment_start = None
+    # the monotonic time of the segment's first frame
+    self.rec_segment_mono = None
+    self.rec_segment_offsets = {}
+    # the frame rate the first recorded video asks for, if it does
+    self.rec_capture_rate = None
     self.rec_stdout = None
+    self.rec_health_log = None
     self.rec_is_recording = False
+    self.rec_is_starting = False
     self.rec_is_paused = False
     self.rec_basepath = Path(os.getcwd()).absolute()
     self.rec_basename = self.slugify(project_name)
@@ -481,17 +947,31 @@ class BaseRecorder(tk.Frame):
     self.rec_timing_file = project_name + '-timing.chap'
     self.rec_timing_chapters_file = project_name + '-chapters.chap'
     self.rec_timing_file_vtt = project_name + '.vtt'
+    self.rec_timing_journal_file = project_name + '-timing.journal'
+    self.rec_journal = None
     self.rec_timing_starttime = None
+    # the time in the recording is measured on the monotonic clock, in seconds,
+    # it doesn't jump when the system time is set
+    self.rec_timing_mono_start = None
     self.rec_timing_markers = []
     self.pause_start = None
-    self.pause_duration = timedelta()
+    self.pause_duration = 0
     self.counter = 0
     self.max_count = 0
     
     self.init_config()
     
+    if recover_timing_journal(self.rec_timing_journal_file):
+      print(f"recovered the timing files of an interrupted recording from '{self.rec_timing_journal_file}'")
+    
     self.md = markdown.Markdown(extensions=['nl2br','fenced_code'])
     self.notes_font_size = 2
+    # formatted notes by slide, font size and whether the title is shown
+    self.notes_html = {}
+    self.notes_pending = False
+    self.notes_file = None
+    self.notes_watcher = None
+    self.latency = LatencyProbe()
     
     self.timer_format = "%H:%M:%S"
     
@@ -528,6 +1008,16 @@ class BaseRecorder(tk.Frame):
     self.btn_rec_pause_text.set("Pause Recording")
     btn_rec_pause.grid(column=1, row=2, rowspan=2, sticky="NESW")
     
+    # what ffmpeg reports about the running capture, values beyond their
+    # threshold turn red
+    frame_health = tk.Frame(frame_up_group)
+    frame_health.grid(column=0, row=4, columnspan=4, sticky="NESW", pady=(10,0))
+    self.health_labels = {}
+    for k, key in enumerate(('fps', 'dup', 'drop', 'speed', 'queue')):
+      tk.Label(frame_health, text=key).grid(column=2*k, row=0, sticky="E")
+      self.health_labels[key] = tk.Label(frame_health, text="-", width=7, anchor="w")
+      self.health_labels[key].grid(column=2*k+1, row=0, sticky="W")
+    
     frame_ur = tk.Frame(frame_up_group)
     frame_ur.grid(column=2, row=0, rowspan=3, sticky="NESW")
     
@@ -562,7 +1052,7 @@ class BaseRecorder(tk.Frame):
     frame_up_group.columnconfigure(2,weight=2)
     
     frame_up_group_bottom = tk.Frame(frame_up_group)
-    frame_up_group_bottom.grid(column=0, row=4, columnspan=4, sticky="NESW")
+    frame_up_group_bottom.grid(column=0, row=5, columnspan=4, sticky="NESW")
     
     sep = ttk.Separator(frame_up_group_bottom, orient='horizontal')
     sep.grid(column=0, row=0, stick="NESW", pady=10, columnspan=2)
@@ -593,6 +1083,9 @@ class BaseRecorder(tk.Frame):
     btn_rc_text.set("Reload Config")
     btn_rc.grid(column=0, row=5, sticky="W")
     
+    self.btn_overview = tk.Button(frame_up_group_bottom, text = "Slide Overview", command = self.show_overview)
+    self.btn_overview.grid(column=1, row=3, sticky="W")
+    
     self.new_geometry_entry = tk.Entry(frame_up_group_bottom)
     self.new_geometry_entry.grid(column=1, row=2, sticky="WE")
     self.btn_rs_text = tk.StringVar()
@@ -780,21 +1273,20 @@ class BaseRecorder(tk.Frame):
     pass
 
   def toggle_recording_pause(self):
-    if self.rec_is_recording:
+    if self.rec_is_recording and not self.rec_is_starting:
       if self.rec_is_paused:
-        os.kill(self.rec_recorder.pid, signal.SIGCONT)
-        self.rec_is_paused = False
-        # ~ self.log_timing('REC_RESUME')
-        self.btn_rec_pause_text.set("Pause Recording")
-        self.pause_duration += datetime.now() - self.pause_start
-        self.pause_start = None
-        print(self.pause_duration)
+        # a new segment, recorder_started continues once it writes its first frame
+        self.btn_rec_pause_text.set("Resuming Recording...")
+        self.start_recorder()
       else:
-        os.kill(self.rec_recorder.pid, signal.SIGSTOP)
-        # ~ self.log_timing('REC_PAUSE')
+        # ending the segment releases the devices, so nothing piles up in
+        # ffmpeg's input queues while paused
+        self.pause_start = time.monotonic()
         self.rec_is_paused = True
         self.btn_rec_pause_text.set("Resume Recording")
-        self.pause_start = datetime.now()
+        self.stop_recorder(len(self.rec_segments.segments))
+        self.rec_segments.add(self.rec_outputs, self.pause_start - self.rec_segment_mono,
+                              self.rec_segment_offsets, self.rec_basepath)
         
   def ffmpeg_configure_and_start(self):
     
@@ -820,12 +1312,15 @@ class BaseRecorder(tk.Frame):
     cmd = f"ffmpeg -y -nostdin"
     out_map = ""
     i_n = 0
+    # ffmpeg's statistics count the frames of the first video output
+    sources = []
     
     if self.get_record_webcam():
       if "FfmpegSourceWebcam" not in self.config or "FfmpegOutputWebcam" not in self.config:
         mb.showinfo("Whoops!", "You need to specify 'FfmpegSourceWebcam' and 'FfmpegOutputWebcam' in your config file")
         return False
       cmd += ' '+self.config.get("FfmpegSourceWebcam")
+      sources.append(self.config.get("FfmpegSourceWebcam"))
       out_map += ' '+f"-map {i_n}:v:0 "+ self.config.get("FfmpegOutputWebcam") + ' ' + webcamFile
       i_n += 1
     
@@ -840,6 +1335,7 @@ class BaseRecorder(tk.Frame):
       height = height-1 if height % 2 != 0 else height
       source = self.config.get("FfmpegSourceScreen").replace('@WIDTH@', str(width)).replace('@HEIGHT@',str(height)).replace('@X@', parts[1]).replace('@Y@', parts[2])
       cmd += ' '+source
+      sources.append(source)
       out_map += ' '+f"-map {i_n}:v:0 "+ self.config.get("FfmpegOutputScreen") + ' ' + screencastFile
       i_n += 1
       
@@ -853,9 +1349,11 @@ class BaseRecorder(tk.Frame):
       source = self.config.get("FfmpegSourceScreen").replace('@WIDTH@', str(geom[0])).replace('@HEIGHT@',str(geom[1])).replace('@X@', str(geom[2])).replace('@Y@', str(geom[3]))
       
       cmd += ' '+source
+      sources.append(source)
       out_map += ' '+f"-map {i_n}:v:0 "+ self.config.get("FfmpegOutputScreen") + ' ' + screenFile
       i_n += 1
       
+    self.rec_capture_rate = source_rate(sources[0]) if sources else None
     cmd += ' '+self.config.get("FfmpegSourceAudio")
     if 'FfmpegOutputAudio' in self.config:
       out_map += ' '+f"-map {i_n}:a:0 "+ self.config.get("FfmpegOutputAudio") + ' ' + audioFile
@@ -865,93 +1363,203 @@ class BaseRecorder(tk.Frame):
     cmd = cmd + out_map
     self.rec_stdout = open(recordLogFile, 'w')
     print(cmd)
-    print(cmd, file=self.rec_stdout)
+    print(cmd, file=self.rec_stdout, flush=True)
     
-    success = False
-    self.rec_recorder = subprocess.Popen(cmd.split(' '), stdout=self.rec_stdout, stderr=self.rec_stdout, universal_newlines=True)
-    with open(recordLogFile, 'r') as log:
-      go_on = True
-      self.rec_audio_start = self.rec_webcam_start = self.rec_screencast_start = datetime.now()
-      
-      audio_match = re.compile(r'^Output [^\']*\''+audioFile+'\'', re.M)
-      webcam_match = re.compile(r'^Output [^\']*\''+webcamFile+'\'', re.M)
-      screencast_match = re.compile(r'^Output [^\']*\''+screencastFile+'\'', re.M)
-      start_match = re.compile(r'^(frame|size)= *\d+', re.M)
-      error_match = re.compile(r'^.*(Device or resource busy|Inappropriate ioctl for device|Input/output error|not found)$', re.M)
-      while go_on:
-        for line in log:
-          # ~ print(line.strip())
-          m = audio_match.match(line)
-          if m:
-            self.rec_audio_start = datetime.now()
-          m = webcam_match.match(line)
-          if m:
-            self.rec_webcam_start = datetime.now()
-          m = screencast_match.match(line)
-          if m:
-            self.rec_screencast_start = datetime.now()
-          m = start_match.match(line)
-          if m:
-            self.rec_timing_starttime = datetime.now()
-            go_on = False
-            success = True
-            break
-          m = error_match.match(line)
-          if m:
-            go_on = False
-            success = False
-            break
+    # resuming after a pause runs the same command for the next segment
+    self.rec_cmd = cmd
+    self.rec_outputs = {'audio': audioFile}
+    if self.get_record_webcam():
+      self.rec_outputs['webcam'] = webcamFile
+    if self.get_record_second_region() and self.get_valid_second_region():
+      self.rec_outputs['screencast'] = screencastFile
+    if self.get_record_animated_slides():
+      self.rec_outputs['screen'] = screenFile
+    segments_file = Path(self.rec_basepath, self.rec_basename+'-segments.json')
+    segments_file.unlink(missing_ok=True)
+    self.rec_segments = RecordingSegments(segments_file)
+    
+    self.btn_text.set("Starting Recording...")
+    self.start_recorder()
+    return True
+  
+  def start_recorder(self):
+    cmd = self.rec_cmd.split(' ')
+    captured = dict(self.rec_outputs)
+    # lossless screen captures may be written in segments that are compressed
+    # while the recording goes on. after a pause, the transcoder writes the new
+    # segment's file, its lossless segments mustn't collide with those of the
+    # previous one that may still be compressed
+    self.rec_transcoders = {}
+    segment = len(self.rec_segments.segments)
+    for name in ('screencast', 'screen'):
+      if name in self.rec_outputs:
+        output = self.rec_outputs[name] if segment == 0 else segment_file(self.rec_outputs[name], segment)
+        transcoder = capture_transcoder_from_config(self.config, output, self.rec_basepath)
+        if transcoder is not None:
+          k = cmd.index(self.rec_outputs[name])
+          cmd[k:k+1] = transcoder.muxer_args()
+          captured[name] = transcoder.pattern
+          self.rec_transcoders[name] = transcoder
+    
+    # ffmpeg's log is followed in a thread and polled from here until the first
+    # frame is written, the ui stays responsive while the devices start
+    self.rec_recorder = subprocess.Popen(cmd, stdout=self.rec_stdout, stderr=subprocess.PIPE, universal_newlines=True)
+    self.rec_monitor = RecorderStartMonitor(self.rec_recorder, self.rec_stdout, captured)
+    for transcoder in self.rec_transcoders.values():
+      transcoder.start()
+    self.rec_is_starting = True
+    self.watch_recorder_start()
+  
+  def stop_recorder(self, segment=None):
+    # with segment, the capture ends as that segment of a paused recording
+    self.rec_recorder.send_signal(signal.SIGINT)
+    self.rec_recorder.wait()
+    # the rest of ffmpeg's log goes to the log file
+    self.rec_monitor.thread.join()
+    # only the segments written since the last one was compressed are left, they
+    # are compressed in the background and joined into the segment's file
+    watching = bool(self.rec_finishing)
+    for name, transcoder in self.rec_transcoders.items():
+      if segment is not None:
+        transcoder.output = segment_file(self.rec_outputs[name], segment)
+      transcoder.finish_async()
+      self.rec_finishing.append(transcoder)
+    self.rec_transcoders = {}
+    if self.rec_finishing and not watching:
+      self.watch_transcoders()
+  
+  def watch_transcoders(self):
+    for transcoder in [t for t in self.rec_finishing if t.finished.is_set()]:
+      self.rec_finishing.remove(transcoder)
+      if not transcoder.ok:
+        mb.showinfo("Whoops!", f"Compressing '{transcoder.output}' failed, its segments are kept next to it")
+    if self.rec_finishing:
+      self.root.after(200, self.watch_transcoders)
+    elif self.rec_after_transcoding is not None:
+      then, self.rec_after_transcoding = self.rec_after_transcoding, None
+      then()
+  
+  def when_transcoded(self, then):
+    # calls then once every capture is compressed
+    if self.rec_finishing:
+      self.rec_after_transcoding = then
+    else:
+      then()
+  
+  def watch_recorder_start(self):
+    state = self.rec_monitor.state(timeout=self.config.getfloat('RecordStartTimeout', 15))
+    if state == 'waiting':
+      self.root.after(20, self.watch_recorder_start)
+    else:
+      self.rec_is_starting = False
+      self.recorder_started(state == 'started')
+  
+  def recorder_started(self, success):
     if not success:
+      if self.rec_recorder.poll() is None:
+        self.rec_recorder.kill()
+      self.rec_recorder.wait()
+      for transcoder in self.rec_transcoders.values():
+        transcoder.stopping.set()
+      self.rec_transcoders = {}
+      if self.rec_is_paused:
+        self.btn_rec_pause_text.set("Resume Recording")
+      else:
+        self.btn_text.set("Start Recording")
       mb.showinfo("Whoops!", "Something's wrong with your recording-device specifications. Try to reload config")
-    else:
-      diff = self.rec_timing_starttime - self.rec_audio_start
-      diff = strfdelta(diff, "%H:%M:%S.%f")
-      print(f"audiooffset={diff}", file=self.rec_stdout)
-      
-      if self.get_record_webcam():
-        diff = self.rec_timing_starttime - self.rec_webcam_start
-        diff = strfdelta(diff, "%H:%M:%S.%f")
-        print(f"webcamoffset={diff}", file=self.rec_stdout)
-      
-      if self.get_record_second_region() or self.get_record_animated_slides():
-        diff = self.rec_timing_starttime - self.rec_screencast_start
-        diff = strfdelta(diff, "%H:%M:%S.%f")
-        print(f"screencastoffset={diff}", file=self.rec_stdout)
-    return success
+      return
+    
+    # the wall clock time of the first frame. the offsets are measured on the
+    # monotonic clock and don't jump with the system time
+    monitor = self.rec_monitor
+    self.rec_segment_start = datetime.now() - timedelta(seconds=time.monotonic() - monitor.started)
+    self.rec_segment_mono = monitor.started
+    self.rec_segment_offsets = {name: monitor.offset(name) for name in self.rec_outputs}
+    if self.rec_is_paused:
+      # the time from the pause to the new segment's first frame isn't part of
+      # the recording
+      self.pause_duration += self.rec_segment_mono - self.pause_start
+      self.pause_start = None
+      self.rec_is_paused = False
+      self.btn_rec_pause_text.set("Pause Recording")
+      return
+    
+    self.rec_timing_starttime = self.rec_segment_start
+    self.rec_timing_mono_start = self.rec_segment_mono
+    self.pause_duration = 0
+    self.rec_health_log = open(self.rec_basename+'-health.csv', 'w')
+    print("time,frame,fps,dup,drop,speed,queue", file=self.rec_health_log, flush=True)
+    self.rec_audio_start = self.rec_timing_starttime - timedelta(seconds=monitor.offset('audio'))
+    self.rec_webcam_start = self.rec_timing_starttime - timedelta(seconds=monitor.offset('webcam'))
+    self.rec_screencast_start = self.rec_timing_starttime - timedelta(seconds=monitor.offset('screencast'))
+    
+    diff = strfdelta(self.rec_timing_starttime - self.rec_audio_start, "%H:%M:%S.%f")
+    print(f"audiooffset={diff}", file=self.rec_stdout)
+    
+    if self.get_record_webcam():
+      diff = strfdelta(self.rec_timing_starttime - self.rec_webcam_start, "%H:%M:%S.%f")
+      print(f"webcamoffset={diff}", file=self.rec_stdout)
+    
+    if self.get_record_second_region() or self.get_record_animated_slides():
+      diff = strfdelta(self.rec_timing_starttime - self.rec_screencast_start, "%H:%M:%S.%f")
+      print(f"screencastoffset={diff}", file=self.rec_stdout)
+    self.rec_stdout.flush()
+    
+    self.btn_text.set("Stop Recording")
+    self.rec_is_recording = True
+    self.log_timing(start=True)
   
   @abstractmethod
   def call_producer(self, audio_offset, webcam_offset, screencast_offset):
     pass
   
   def toggle_recording(self):
+    if self.rec_is_starting or self.rec_is_stopping:
+      return
     if self.rec_is_recording:
-      self.btn_text.set("Start Recording")
+      paused = self.rec_is_paused
+      if paused:
+        # the recording ends where it was paused, the last segment is complete
+        self.pause_duration += time.monotonic() - self.pause_start
+        self.pause_start = None
+        self.rec_is_paused = False
+        self.btn_rec_pause_text.set("Pause Recording")
       self.log_timing(marker=REC_TIMING_MARKER_END)
+      self.rec_journal.stop()
       self.rec_is_recording = False
-      if self.rec_recorder:
+      if self.rec_recorder and not paused:
         if self.get_record_webcam():
           time.sleep(1)
         if self.get_record_animated_slides():
           time.sleep(3)
-        self.rec_recorder.send_signal(signal.SIGINT)
-        self.rec_recorder.wait()
-      
-      audio_offset = strfdelta(self.rec_timing_starttime - self.rec_audio_start, "%H:%M:%S.%f")
-      webcam_offset = strfdelta(self.rec_timing_starttime - self.rec_webcam_start, "%H:%M:%S.%f")
-      screencast_offset = strfdelta(self.rec_timing_starttime - self.rec_screencast_start, "%H:%M:%S.%f")
-      self.call_producer(audio_offset, webcam_offset, screencast_offset)                               
-      
-      self.rec_timing_starttime = None
-      if self.rec_stdout:
-        self.rec_stdout.close()
+        self.stop_recorder(len(self.rec_segments.segments) if self.rec_segments.segments else None)
+        if self.rec_segments.segments:
+          self.rec_segments.add(self.rec_outputs, None, self.rec_segment_offsets, self.rec_basepath)
+      # production needs the compressed captures
+      self.rec_is_stopping = True
+      self.btn_text.set("Stopping Recording...")
+      self.when_transcoded(self.recording_stopped)
     else:
       if self.get_record_second_region() and not self.get_valid_second_region():
         mb.showinfo("No valid geometry", "Please enter a valid region of the screen if you want to record a screen cast!")
       else:
-        if self.ffmpeg_configure_and_start():
-          self.btn_text.set("Stop Recording")
-          self.rec_is_recording = True
-          self.log_timing(start=True)
+        # recorder_started continues once ffmpeg writes its first frame
+        self.ffmpeg_configure_and_start()
+  
+  def recording_stopped(self):
+    self.rec_is_stopping = False
+    self.btn_text.set("Start Recording")
+    audio_offset = strfdelta(self.rec_timing_starttime - self.rec_audio_start, "%H:%M:%S.%f")
+    webcam_offset = strfdelta(self.rec_timing_starttime - self.rec_webcam_start, "%H:%M:%S.%f")
+    screencast_offset = strfdelta(self.rec_timing_starttime - self.rec_screencast_start, "%H:%M:%S.%f")
+    self.call_producer(audio_offset, webcam_offset, screencast_offset)                               
+    
+    self.rec_timing_starttime = None
+    if self.rec_stdout:
+      self.rec_stdout.close()
+    if self.rec_health_log:
+      self.rec_health_log.close()
+      self.rec_health_log = None
   
   def get_title_to_log(self, counter):
     cur_title = "{:02d}".format(counter)
@@ -961,47 +1569,41 @@ class BaseRecorder(tk.Frame):
       return None
     
   
+  def recording_time(self):
+    # the time in the recording, without the pauses
+    return timedelta(seconds=time.monotonic() - self.rec_timing_mono_start - self.pause_duration)
+  
   def log_timing(self, marker=None, start=False):
+    # only the journal is written while recording, the timing files are written
+    # from it when the recording stops
     out_mark = self.counter + 1 if marker is None else marker
     
     if start:
-      with open(self.rec_timing_file, 'w') as tf:
-        print("{} S".format(self.rec_timing_starttime), file=tf)
-      if self.titles:
-        with open(self.rec_timing_chapters_file, 'w') as tf:
-          print("{} S".format(self.rec_timing_starttime), file=tf)
-      if self.get_write_vtt():
-        with open(self.rec_timing_file_vtt, 'w') as tf:
-          print("WEBVTT\n\n", end='', file=tf)
+      self.rec_journal = timing_journal_from_config(self.config, self.rec_timing_journal_file)
+      self.rec_journal.start(self.rec_timing_starttime, self.rec_timing_file,
+                             self.rec_timing_chapters_file if self.titles else None,
+                             self.rec_timing_file_vtt if self.get_write_vtt() else None)
     
     if self.rec_is_recording and not self.rec_is_paused:
-      diff = datetime.now() - self.rec_timing_starttime - self.pause_duration
+      diff = self.recording_time()
       self.rec_timing_markers.append(diff)
-      with open(self.rec_timing_file, 'a') as tf:
-        print("{} {}".format(strfdelta(diff, "%H:%M:%S.%f"), out_mark), file=tf)
-      if self.titles and marker is None:
-        title = self.get_title_to_log(self.counter+1)
-        with open(self.rec_timing_chapters_file, 'a') as tf:
-          print("{} {}".format(strfdelta(diff, "%H:%M:%S.%f"), title), file=tf)
-      if self.get_write_vtt():
-        with open(self.rec_timing_file_vtt, 'a') as tf:
-          diff = strfdelta(diff, "%H:%M:%S,%f")
-          last_title = self.get_title_to_log(self.counter if marker != REC_TIMING_MARKER_END else self.counter +1)
-          if not start:
-            print("{}\n- {}\n".format(diff, last_title), end='', file=tf)
-          else:
-            diff = "00:00:00,000"
-          if marker != REC_TIMING_MARKER_END:
-            print("\n{}\n{} --> ".format(out_mark, diff), end='', file=tf)
-    
+      self.rec_journal.add(diff, out_mark, self.counter + 1, self.get_title_to_log(self.counter + 1))
+      self.root.after_idle(self.rec_journal.tick)
   
   def next_block(self):
     if self.counter < self.max_count:
       self.counter += 1
-      self.update_notes()
-      self.log_timing()
-      self.update_counter_label()
-      self.next_block_special()
+      self.show_block(self.next_block_special)
+  
+  def show_block(self, show_special):
+    # the slide and the preview come first, the notes once Tk painted them and
+    # is idle again. nothing on this path waits for a file
+    self.latency.change()
+    self.log_timing()
+    self.update_counter_label()
+    show_special()
+    self.root.after_idle(self.latency.painted)
+    self.schedule_notes()
   
   @abstractmethod
   def next_block_special(self):
@@ -1011,13 +1613,24 @@ class BaseRecorder(tk.Frame):
   def previous_block_special(self):
     pass
 
+  @abstractmethod
+  def goto_block_special(self):
+    pass
+  
+  @abstractmethod
+  def show_overview(self):
+    pass
+  
+  def goto_block(self, i):
+    # jumps directly, so only one timing entry is logged
+    if 0 <= i < self.max_count and i != self.counter:
+      self.counter = i
+      self.show_block(self.goto_block_special)
+
   def previous_block(self):
     if self.counter > 0:
       self.counter -= 1
-      self.update_notes()
-      self.log_timing()
-      self.update_counter_label()
-      self.previous_block_special()
+      self.show_block(self.previous_block_special)
   
   def update_counter_label(self):
     self.slide_label.configure(text=f"{self.counter+1}/{self.max_count}")
@@ -1034,18 +1647,66 @@ class BaseRecorder(tk.Frame):
     self.max_count = len(self.notes)
   
   def reload_notes(self):
-    self.notes, self.titles = self.load_notes_and_titles()
+    # reads and converts all notes again
+    self.notes_file = NotesFile(self.rec_notes_file, self.md.convert)
+    self.load_notes_and_titles()
+    self.notes, self.titles = self.notes_file.notes, self.notes_file.titles
+    self.notes_html = {}
     self.update_max_count()
     self.update_notes()
+    self.watch_notes()
+  
+  def watch_notes(self):
+    if self.notes_watcher is None and self.config.getboolean("NotesWatch", True):
+      self.notes_watcher = FileWatcher(self.rec_notes_file)
+      self.root.after(int(1000 * self.config.getfloat("NotesWatchInterval", 1)), self.check_notes)
+  
+  def check_notes(self):
+    if not self.config.getboolean("NotesWatch", True):
+      self.notes_watcher.close()
+      self.notes_watcher = None
+      return
+    if self.notes_watcher.changed():
+      try:
+        changed = self.notes_file.load()
+      except Exception as e:
+        # half way through an edit, the next change will fix it
+        print(f"could not reload the notes: {e}")
+        changed = set()
+      if changed:
+        print(f"reloaded the notes of {len(changed)} slides")
+        self.notes_html = {k: v for k, v in self.notes_html.items() if "{:02d}".format(k[0]+1) not in changed}
+        self.update_max_count()
+        self.update_counter_label()
+        if "{:02d}".format(self.counter+1) in changed:
+          self.update_notes()
+    self.root.after(int(1000 * self.config.getfloat("NotesWatchInterval", 1)), self.check_notes)
+  
+  def get_notes_html(self, counter):
+    show_title = self.config.getboolean("NotesShowTitle", False)
+    key = (counter, self.notes_font_size, show_title)
+    if key not in self.notes_html:
+      i = "{:02d}".format(counter+1)
+      title = ''
+      if show_title and i in self.titles:
+        title = '<h2>{}</h2>'.format(self.titles[i])
+      if i in self.notes:
+        self.notes_html[key] = '<html>{}<font size="+{}">{}</font></html>'.format(title,self.notes_font_size,self.notes[i])
+      else:
+        self.notes_html[key] = '<html></html>'
+    return self.notes_html[key]
+  
+  def schedule_notes(self):
+    # quick key presses only render the notes of the last slide
+    if not self.notes_pending:
+      self.notes_pending = True
+      self.root.after_idle(self.update_notes)
   
   def update_notes(self):
-    self.notes_txt.set_content('<html></html>')
-    i = "{:02d}".format(self.counter+1)
-    title = ''
-    if self.config.getboolean("NotesShowTitle", False) and i in self.titles:
-      title = '<h2>{}</h2>'.format(self.titles[i])
-    if i in self.notes:
-      self.notes_txt.set_content('<html>{}<font size="+{}">{}</font></html>'.format(title,self.notes_font_size,self.notes[i]))
+    self.notes_pending = False
+    self.notes_txt.set_content(self.get_notes_html(self.counter))
+    # the neighbors' notes are formatted while nothing else happens
+    self.root.after_idle(self.get_notes_html, min(self.counter + 1, self.max_count))
 
   def onKeyPress(self, event):
     kc = event.keycode
@@ -1062,6 +1723,8 @@ class BaseRecorder(tk.Frame):
       self.toggle_recording()
     elif ch == 'x':
       self.log_timing(REC_TIMING_MARKER_SPECIAL)
+    elif ch == 'o':
+      self.show_overview()
 
   def update_preview_img(self):
     imprev = self.list_preview_images[self.counter + 1]
@@ -1074,52 +1737,64 @@ class BaseRecorder(tk.Frame):
     col = '#FF0000' if self.rec_is_recording else '#000000'
     self.clock_label.configure(text=datetime.strftime(now,self.timer_format))
     self.recording_timer_label.configure(fg=col)
+    if self.rec_is_recording:
+      self.rec_journal.tick()
     if self.rec_is_recording and not self.rec_is_paused:
-      diff = now - self.rec_timing_starttime - self.pause_duration
+      diff = self.recording_time()
+      self.update_health(diff)
       diff = str(diff).split('.')[0]
       self.recording_timer_label.configure(text = datetime.strftime(datetime.strptime(diff, "%H:%M:%S"), self.timer_format), fg=col)
     self.root.after(1000, self.update_clock)
+  
+  def update_health(self, recording_time):
+    # shows the capture's latest statistics and adds them to the health log, with
+    # the time in the recording like the timing file has it
+    health = self.rec_monitor.health() if self.rec_monitor is not None and not self.rec_is_starting else None
+    if health is None:
+      return
+    frames = health['frame'] or 0
+    values = {
+      'fps': f"{health['fps']:.1f}" if health['fps'] is not None else "-",
+      'dup': f"{health['dup']:.0f}",
+      'drop': f"{health['drop']:.0f}",
+      'speed': f"{health['speed']:.2f}x" if health['speed'] is not None else "-",
+      'queue': str(health['queue']),
+    }
+    bad = {
+      'fps': health['fps'] is not None and self.rec_capture_rate is not None and
+             100 * health['fps'] / self.rec_capture_rate < self.config.getfloat('RecordHealthMinFpsPercent', 90),
+      'dup': frames > 0 and 100 * health['dup'] / frames > self.config.getfloat('RecordHealthMaxDupPercent', 5),
+      'drop': frames > 0 and 100 * health['drop'] / frames > self.config.getfloat('RecordHealthMaxDropPercent', 0),
+      'speed': health['speed'] is not None and health['speed'] < self.config.getfloat('RecordHealthMinSpeed', 0.98),
+      'queue': health['queue'] > 0,
+    }
+    for key, label in self.health_labels.items():
+      label.configure(text=values[key], fg='#FF0000' if bad[key] else '#000000')
+    if self.rec_health_log:
+      row = [strfdelta(recording_time, "%H:%M:%S.%f")] + ['' if health[key] is None else f"{health[key]:g}" for key in ('frame', 'fps', 'dup', 'drop', 'speed', 'queue')]
+      print(','.join(row), file=self.rec_health_log, flush=True)
 
   def load_notes_and_titles(self):
-    notes = {}
-    titles = {}
+    # returns the slides whose notes changed
     p = Path(self.rec_notes_file)
     pptx = Path(self.config.get("PathToPPTX",self.rec_notes_file.replace('.notes', '.pptx')))
     if not p.exists():
       if pptx.exists():
         print("loading slide infos from",pptx.resolve())
-        cmd = ["extractnotes", pptx.resolve(), p.resolve()]
-        subprocess.run(cmd, cwd=self.rec_basepath)
+        try:
+          write_notes(pptx, p, notes_cache_from_config(self.config))
+        except Exception as e:
+          print(f"could not extract the notes from '{pptx}': {e}")
       else:
         print(f"could not find notes at expected location '{str(p)}'")
-    
-    if p.exists():
-      cur = []
-      cur_s = None
-      with open(p,'r') as _f:
-        for line in _f:
-          m = re.match( r'^#\s*(\d+)', line, re.M)
-          if m:
-            if cur_s in notes:
-              raise Exception('slide has more than one notes section')
-            if cur_s is not None:
-              notes[cur_s] = self.md.convert((''.join(cur)).strip())
-            cur = []
-            cur_s = (m.group(0)).replace('#','').strip()
-          else:
-            m = re.match( r'^#title:\s+(.*)', line, re.M)
-            if m:
-              if cur_s is not None:
-                titles[cur_s] = m.group(1).strip()
-            else:
-              cur.append(line)
-        # ~ notes[cur_s] = cur
-        notes[cur_s] = self.md.convert((''.join(cur)).strip())
-    return notes, titles
+    return self.notes_file.load()
       
   def close_window(self):
     if self.rec_is_recording:
       self.rec_recorder.terminate()
+    summary = self.latency.summary()
+    if summary:
+      print(summary)
     self.root.destroy()
   
   
@@ -1146,6 +1821,7 @@ class SlideView:
     self.parent = parent
     self.controller = controller
     self.resize_from_update = False
+    self.image_item = None
     self.parent.bind('<KeyPress>', self.controller.onKeyPress)
     self.max_w = round(self.parent.winfo_screenwidth() * .97)
     self.max_h = round(self.parent.winfo_screenheight() * .94)
@@ -1193,10 +1869,25 @@ class SlideView:
       
   def init(self, pages, startslide):
     self.pages = pages
+    self.images = ScaledImageCache(pages, self.controller.config.getfloat('SlideImageCacheSize', 256))
     self.startslide = int(startslide)
     self.current_slide = self.startslide
     self.resize(initial=True, geom=None)
-    self.aspect_ratio = self.list_images[0].width() / self.list_images[0].height()
+    im = self.get_image(self.controller.counter)
+    self.aspect_ratio = im.width() / im.height()
+  
+  def get_image(self, i):
+    if i >= len(self.pages):
+      # a black screen after the last slide
+      if self.end_image is None:
+        im = self.get_image(len(self.pages) - 1)
+        self.end_image = make_dummy_image(im.width(),im.height(), marked=False)
+      return self.end_image
+    return self.images.get(i, self.pic_size)
+  
+  def prefetch_neighbors(self):
+    i = self.controller.counter
+    self.images.prefetch((i + 1, i - 1), self.pic_size)
   
   def resize(self, initial=False, geom=None, resize_frame=False):
     if geom is None or geom != self.last_geom:
@@ -1214,34 +1905,37 @@ class SlideView:
         new_h = self.frame.winfo_height()
       pic_width = new_w
       pic_height = new_h
-      self.list_images = []
-      # Storing the converted images into list
-      max_w = 0
-      for i in range(len(self.pages)):
-        img = self.pages[i].copy()
-        img.thumbnail((pic_width,pic_height), Resampling.LANCZOS)
-        max_w = max(max_w, img.size[0])
-        self.list_images.append(ImageTk.PhotoImage(img))
-      self.list_images.append(make_dummy_image(self.list_images[0].width(),self.list_images[0].height(), marked=False))
-      self.cv1.config(width = self.list_images[0].width(), height=self.list_images[0].height())
+      # slides are scaled on demand, only the current one right away
+      self.pic_size = (pic_width, pic_height)
+      self.end_image = None
+      im = self.get_image(self.controller.counter)
+      self.cv1.config(width = im.width(), height=im.height())
       if self.parent.attributes("-fullscreen"):
         self.cv1.config(background="black")
       else:
         self.cv1.config(background=self.defaultbg)
+      # the canvas' new size is needed to center the slide
+      self.parent.update()
       self.update_main_img()
   
   def update_main_img(self):
-    im = self.list_images[self.controller.counter]
-    # ~ self.cv1.delete("all")
-    self.parent.update()
-    self.cv1.create_image(self.cv1.winfo_width()/2, self.cv1.winfo_height()/2, anchor = tk.CENTER, image = im)
+    # keep a reference, the cache may drop the image while it's shown
+    im = self.current_image = self.get_image(self.controller.counter)
+    # the slide is a single canvas item, changing slides only swaps its image
+    x, y = self.cv1.winfo_width()/2, self.cv1.winfo_height()/2
+    if self.image_item is None:
+      self.image_item = self.cv1.create_image(x, y, anchor = tk.CENTER, image = im)
+    else:
+      self.cv1.coords(self.image_item, x, y)
+      self.cv1.itemconfigure(self.image_item, image = im)
+    self.parent.after_idle(self.prefetch_neighbors)
   
   def close_window(self):
     self.controller.close_window()
     
   def get_recording_geom(self):
     self.parent.update()
-    im = self.list_images[self.controller.counter]
+    im = self.get_image(self.controller.counter)
     x0 = self.frame.winfo_rootx() + round(self.cv1.winfo_width()/2) - round(im.width()/2)
     y0 = self.frame.winfo_rooty() + round(self.cv1.winfo_height()/2) - round(im.height()/2)
     return (im.width(),im.height(),x0,y0)
@@ -1254,6 +1948,7 @@ class PresenterView(BaseRecorder):
     self.is_initialized = False
     
     self.pdffile = pdffile if pdffile.endswith('.pdf') else pdffile+'.pdf'
+    self.overview_atlas = None
 
     max_w = round(self.root.winfo_screenwidth() * .95)
     max_h = round(self.root.winfo_screenheight() * .91)
@@ -1280,6 +1975,7 @@ class PresenterView(BaseRecorder):
     
     self.cv2 = tk.Canvas(self.root, bd=1)#, relief=tk.RAISED)
     self.cv2.grid(column=0, row=1, columnspan=2, sticky="NESW", padx=5, pady=3)
+    self.preview_item = None
     
     self.root.grid_columnconfigure(0, weight=3)
     self.root.grid_columnconfigure(1, weight=3)
@@ -1303,13 +1999,16 @@ class PresenterView(BaseRecorder):
     self.root.after(500, self.load_and_init, startslide, max_h)
   
   def load_and_init(self, startslide, max_h):
+    load_start = time.monotonic()
     # Here the PDF is converted to list of images
     dpi = self.config.getint('SlideLoadDpi', 300)
     hfac = self.config.getfloat('SlideLoadHeightFactor', 2.0)
-    self.pages = convert_from_path(self.pdffile,size=(None, max_h*hfac),dpi=dpi)
+    self.counter = int(startslide)-1
+    self.pages = open_pages(self.pdffile, dpi, (None, max_h*hfac), self.config, position=self.counter)
     self.slide_viewer.init(self.pages, self.counter)
+    self.startup_latency = time.monotonic() - load_start
+    print(f"time to first slide: {self.startup_latency:.3f}s")
     super().load_and_init()
-    self.counter = int(startslide)-1
     self.max_count = len(self.pages)
     self.update_counter_label()
   
@@ -1324,17 +2023,12 @@ class PresenterView(BaseRecorder):
   def resize(self, initial=False):
     # call self
     if initial:
-      self.list_preview_images = []
+      self.preview_images = ScaledImageCache(self.pages, self.config.getfloat('SlideImageCacheSize', 256))
       prev_pic_width = self.cv2.winfo_width()
       prev_pic_height = self.cv2.winfo_height()
-      # Create Preview images
-      for i in range(len(self.pages)):
-        img = self.pages[i].copy()
-        img.thumbnail((prev_pic_width,prev_pic_height), Resampling.LANCZOS)
-        self.list_preview_images.append(ImageTk.PhotoImage(img))
-      # append a black screen at the end
-      self.list_preview_images.append(make_dummy_image(self.list_preview_images[0].width(),self.list_preview_images[0].height(), marked=False))
-      self.list_preview_images.append(make_dummy_image(self.list_preview_images[0].width(),self.list_preview_images[0].height()))
+      # Preview images are created on demand
+      self.preview_size = (prev_pic_width, prev_pic_height)
+      self.preview_end_images = None
     if len(self.pages) >= 2:
       self.update_preview_img()
     
@@ -1357,20 +2051,59 @@ class PresenterView(BaseRecorder):
                                self.rec_stdout)
     Producer.produce_recording(self.root)
     
+  def get_preview_image(self, i):
+    if i >= len(self.pages):
+      # a black screen after the last slide, and a marked one after that
+      if self.preview_end_images is None:
+        im = self.get_preview_image(len(self.pages) - 1)
+        self.preview_end_images = (make_dummy_image(im.width(),im.height(), marked=False),
+                                   make_dummy_image(im.width(),im.height()))
+      return self.preview_end_images[min(i - len(self.pages), 1)]
+    return self.preview_images.get(i, self.preview_size)
+  
   def update_preview_img(self):
-    imprev = self.list_preview_images[self.counter + 1]
-    if self.counter > 0:
-      self.cv2.delete("all")
-    self.cv2.create_image(self.cv2.winfo_width()/2, self.cv2.winfo_height()/2, anchor = tk.CENTER, image = imprev)
+    imprev = self.preview_image = self.get_preview_image(self.counter + 1)
+    x, y = self.cv2.winfo_width()/2, self.cv2.winfo_height()/2
+    if self.preview_item is None:
+      self.preview_item = self.cv2.create_image(x, y, anchor = tk.CENTER, image = imprev)
+    else:
+      self.cv2.coords(self.preview_item, x, y)
+      self.cv2.itemconfigure(self.preview_item, image = imprev)
+    self.root.after_idle(self.preview_images.prefetch, (self.counter + 2, self.counter), self.preview_size)
+  
+  def update_page_position(self):
+    if isinstance(self.pages, LazyPages):
+      self.pages.set_position(self.counter)
     
   def next_block_special(self):
+    self.update_page_position()
     self.slide_viewer.update_main_img()
     self.update_preview_img()
 
   def previous_block_special(self):
+    self.update_page_position()
     self.slide_viewer.update_main_img()
     self.update_preview_img()
 
+  def goto_block_special(self):
+    self.update_page_position()
+    self.slide_viewer.update_main_img()
+    self.update_preview_img()
+  
+  def show_overview(self):
+    if not self.is_initialized:
+      return
+    cols = self.config.getint('SlideOverviewColumns', 6)
+    thumb_width = self.config.getint('SlideOverviewThumbWidth', 240)
+    # the atlas is kept until the size changes or pages were still missing
+    if self.overview_atlas is None or self.overview_atlas[0] != (thumb_width, cols) or not self.overview_atlas[3]:
+      atlas, cell, complete = build_atlas(self.pages, thumb_width, cols)
+      if atlas is None:
+        return
+      self.overview_atlas = ((thumb_width, cols), ImageTk.PhotoImage(atlas), cell, complete)
+    _, atlas, cell, _ = self.overview_atlas
+    self.overview = SlideOverview(self.root, self, atlas, cell, cols)
+
 
 class ScreencasterView(BaseRecorder):
 
@@ -1380,6 +2113,7 @@ class ScreencasterView(BaseRecorder):
     self.additional_source_animated_slides_check['state'] = 'disabled'
     self.btn_keep_aspect_ratio_check['state'] = 'disabled'
     self.btn_fs['state'] = 'disabled'
+    self.btn_overview['state'] = 'disabled'
     self.btn_rs_text.set("Resize Window to Geometry")
     
     self.root.after(500, self.load_and_init)
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+
+import time
+import json
+import os
+import sys
+import random
+import platform
+import subprocess
+import configparser
+from datetime import datetime, timedelta
+from tempfile import TemporaryDirectory
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+from pdfpages import render_pages, load_pages, pyramid_of, DEFAULT_LOAD_WORKERS
+from timeline import read_timeline, format_ms, MARKER_SPECIAL, MARKER_END
+
+# bump this whenever the meaning of a metric changes, compare refuses to mix formats
+RESULTS_FORMAT = 1
+
+
+def bench_rasterize(pdffile, dpi=300, height=4320, workers='1,2,4,8'):
+  "pages per second for pdf rasterization with different numbers of workers"
+  results = []
+  for n in [int(w) for w in workers.split(',')]:
+    start = time.monotonic()
+    pages = render_pages(pdffile, int(dpi), (None, int(height)), workers=n)
+    duration = time.monotonic() - start
+    results.append({'workers': n, 'pages': len(pages), 'seconds': round(duration, 3),
+                    'pages_per_second': round(len(pages) / duration, 2)})
+    print(f"{n:3d} workers: {len(pages)} pages in {duration:.2f}s, {len(pages) / duration:.2f} pages/s")
+  return results
+
+def load_markers(timing_file):
+  return [timedelta(milliseconds=ms) for ms in read_timeline(timing_file).ms]
+
+def bench_slideshow(pdffile, timing_file, geom='1920x1080', dpi=300, height=2160):
+  "slideshow production with png files, piped raw frames and cached segments"
+  from present import MediaProducer
+  config = configparser.ConfigParser()['DEFAULT']
+  pages = load_pages(pdffile, int(dpi), (None, int(height)))
+  w, _, h = geom.partition('x')
+  results = []
+  with TemporaryDirectory() as tmpdir, open(os.devnull, 'w') as devnull:
+    producer = MediaProducer(config, 'bench', tmpdir, pages, load_markers(timing_file), str(Path(timing_file).resolve()),
+                             False, False, False, '00:00:00.000', '00:00:00.000', '00:00:00.000', rec_stdout=devnull)
+    config['RecordProduceSegmentCacheDir'] = str(Path(tmpdir, 'segments'))
+    # the second segments run finds all segments in the cache
+    for name, produce in (('png', producer.produce_slideshow_png), ('pipe', producer.produce_slideshow_pipe),
+                          ('segments-cold', producer.produce_slideshow_segments), ('segments-warm', producer.produce_slideshow_segments)):
+      start = time.monotonic()
+      produce((int(w), int(h)))
+      duration = time.monotonic() - start
+      size = Path(tmpdir, 'bench-screen.mp4').stat().st_size
+      results.append({'path': name, 'seconds': round(duration, 3), 'output_bytes': size})
+      print(f"{name:>13}: {duration:.2f}s, {size} bytes")
+  return results
+
+
+def make_pdf(filename, n_pages, size=(1920, 1080)):
+  # slides with a title, a few bars and some noise, so they neither rasterize
+  # nor encode trivially
+  rnd = random.Random(n_pages)
+  slides = []
+  for k in range(n_pages):
+    img = Image.new('RGB', size, (250, 250, 245))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, size[0], size[1] // 8), fill=(40, 60, 120))
+    draw.text((size[0] // 20, size[1] // 30), f"Slide {k+1}", fill=(255, 255, 255))
+    for b in range(8):
+      x = size[0] // 10 + b * size[0] // 10
+      h = rnd.randint(size[1] // 10, size[1] // 2)
+      draw.rectangle((x, size[1] * 9 // 10 - h, x + size[0] // 14, size[1] * 9 // 10), fill=(rnd.randint(0, 255), 120, 80))
+    for _ in range(200):
+      x, y = rnd.randrange(size[0]), rnd.randrange(size[1])
+      draw.ellipse((x, y, x + 12, y + 12), outline=(0, 0, 0))
+    slides.append(img)
+  slides[0].save(filename, 'pdf', save_all=True, append_images=slides[1:], resolution=144)
+
+def make_timing(filename, n_pages, seconds):
+  # walks through the deck at an even pace, jumping back now and then
+  rnd = random.Random(n_pages * 1000 + seconds)
+  step = seconds / (n_pages * 1.5)
+  start = datetime(2024, 1, 1, 10, 0, 0)
+  with open(filename, 'w') as tf:
+    print(start.strftime('%Y-%m-%d %H:%M:%S.%f') + ' S', file=tf)
+    t = 0.
+    slide = 1
+    while t < seconds:
+      print(f"{strf_seconds(t)} {slide}", file=tf)
+      t += step * rnd.uniform(.5, 1.5)
+      slide = max(1, slide - 1) if rnd.random() < .2 else min(n_pages, slide + 1)
+    print(f"{strf_seconds(seconds)} END", file=tf)
+
+def strf_seconds(seconds):
+  ms = int(round(seconds * 1000))
+  h, ms = divmod(ms, 3600000)
+  m, ms = divmod(ms, 60000)
+  s, ms = divmod(ms, 1000)
+  return f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
+
+def make_media(directory, basename, seconds):
+  # stand-ins for the recorded devices, encoded like the default config does
+  lavfi = {
+    '-audio.flac': ['-i', f'sine=frequency=440:sample_rate=48000:duration={seconds}', '-c:a', 'flac'],
+    '-screencast.mkv': ['-i', f'testsrc=size=1280x720:rate=10:duration={seconds}', '-c:v', 'libx264', '-preset', 'ultrafast', '-qp', '0', '-pix_fmt', 'yuv444p'],
+    '-webcam.mkv': ['-i', f'testsrc2=size=960x540:rate=25:duration={seconds}', '-c:v', 'libx264', '-preset', 'faster', '-pix_fmt', 'yuv420p'],
+  }
+  for suffix, args in lavfi.items():
+    cmd = ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'lavfi'] + args + [basename + suffix]
+    subprocess.run(cmd, cwd=directory, check=True)
+
+def timed(func, *args, **kwargs):
+  start = time.monotonic()
+  result = func(*args, **kwargs)
+  return time.monotonic() - start, result
+
+def bench_resize(pages, sizes):
+  # what SlideView.resize and PresenterView.resize do for the current slide: scale
+  # it, or the next one for the preview, to the new size. without a display only
+  # the scaling is timed, the PhotoImage is skipped
+  try:
+    import tkinter as tk
+    from PIL import ImageTk
+    root = tk.Tk()
+    root.withdraw()
+  except Exception:
+    root = None
+  results = {}
+  for size in sizes:
+    w, _, h = size.partition('x')
+    for view, box in (('slideview', (int(w), int(h))), ('presenterview', (int(w) // 3, int(h) // 3))):
+      # every size starts without pyramids, like the first resize to it
+      getattr(pages, 'pyramids', {}).clear()
+      durations = []
+      for i in range(len(pages)):
+        j = min(i + 1, len(pages) - 1) if view == 'presenterview' else i
+        d, img = timed(lambda: pyramid_of(pages, j).thumbnail(box))
+        if root is not None:
+          d += timed(ImageTk.PhotoImage, img)[0]
+        durations.append(d)
+      durations.sort()
+      results[f'resize-{view}/size={size}/mean'] = sum(durations) / len(durations)
+      results[f'resize-{view}/size={size}/p95'] = durations[int(.95 * (len(durations) - 1))]
+  if root is not None:
+    root.destroy()
+  return results, root is not None
+
+def bench_production(pages, directory, basename):
+  # produce_recording and produce_screencast with everything, like after a
+  # recording with webcam. the produced files are overwritten by the next run
+  from present import MediaProducer
+  config = configparser.ConfigParser()['DEFAULT']
+  config['RecordProduceEverything'] = 'yes'
+  config['RecordProduceCustomGeom'] = '1920x1080'
+  # every run has to do the full work
+  config['RecordProduceIncremental'] = 'no'
+  config['RecordProduceSegmentCacheDir'] = str(Path(directory, 'segments'))
+  timing_file = basename + '-timing.chap'
+  with open(os.devnull, 'w') as devnull:
+    producer = MediaProducer(config, basename, directory, pages, load_markers(Path(directory, timing_file)), timing_file,
+                             False, False, True, '00:00:00.000', '00:00:00.000', '00:00:00.000', rec_stdout=devnull)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+      recording, _ = timed(producer.produce_recording, None)
+      recording_steps = list(producer.progress.steps)
+      screencast, _ = timed(producer.produce_screencast, None)
+    finally:
+      os.chdir(cwd)
+  results = {'produce-recording': recording, 'produce-screencast': screencast}
+  screencast_steps = producer.progress.steps[len(recording_steps):]
+  for phase, steps in (('recording', recording_steps), ('screencast', screencast_steps)):
+    for step in steps:
+      results[f"step-{phase}/{step['name'][len(basename):]}"] = step['wall_time']
+  return results
+
+def bench_suite(pages: "deck lengths" = '10,40', seconds: "recording lengths" = '60,300',
+                sizes: "window sizes for the resize benchmarks" = '1280x720,1920x1080,3840x2160',
+                dpi: "SlideLoadDpi" = 150, height: "rasterized page height" = 2160, out: "write the results here" = ''):
+  "rasterization, resizing and production on generated decks and recordings"
+  results = {}
+  tk_display = False
+  basename = 'bench'
+  for n in [int(p) for p in pages.split(',')]:
+    with TemporaryDirectory() as tmpdir:
+      pdffile = str(Path(tmpdir, basename + '.pdf'))
+      make_pdf(pdffile, n)
+      print(f"{n} pages", file=sys.stderr)
+      d, deck = timed(load_pages, pdffile, int(dpi), (None, int(height)), workers=DEFAULT_LOAD_WORKERS)
+      results[f"load/pages={n}"] = d
+      resized, tk_display = bench_resize(deck, sizes.split(','))
+      for name, value in resized.items():
+        results[f"{name}/pages={n}"] = value
+      for secs in [int(s) for s in seconds.split(',')]:
+        print(f"{n} pages, {secs}s recording", file=sys.stderr)
+        make_timing(Path(tmpdir, basename + '-timing.chap'), n, secs)
+        make_media(tmpdir, basename, secs)
+        for name, value in bench_production(deck, tmpdir, basename).items():
+          results[f"{name}/pages={n}/seconds={secs}"] = value
+  report = {
+    'format': RESULTS_FORMAT,
+    'created': datetime.now().isoformat(timespec='seconds'),
+    'machine': {'cpus': os.cpu_count(), 'python': platform.python_version(), 'platform': platform.platform(), 'tk_display': tk_display},
+    'parameters': {'pages': pages, 'seconds': seconds, 'sizes': sizes, 'dpi': int(dpi), 'height': int(height)},
+    # all values are seconds, lower is better
+    'results': {name: round(value, 4) for name, value in sorted(results.items())},
+  }
+  if out:
+    with open(out, 'w') as f:
+      json.dump(report, f, indent=2, sort_keys=True)
+      print(file=f)
+  return report
+
+def compare(baseline: "results of an earlier suite run", current: "results to check", threshold: "relative slowdown that counts as regression" = 0.1):
+  "compares two suite results and lists the metrics that got slower"
+  with open(baseline) as f:
+    old = json.load(f)
+  with open(current) as f:
+    new = json.load(f)
+  if old.get('format') != new.get('format'):
+    raise Exception(f"can't compare results of format {old.get('format')} and {new.get('format')}")
+  threshold = float(threshold)
+  rows = []
+  for name in sorted(set(old['results']) | set(new['results'])):
+    a, b = old['results'].get(name), new['results'].get(name)
+    if a is None or b is None:
+      rows.append({'metric': name, 'baseline': a, 'current': b, 'change': None, 'regression': False})
+      continue
+    change = (b - a) / a if a > 0 else 0.
+    rows.append({'metric': name, 'baseline': a, 'current': b, 'change': round(change, 3), 'regression': change > threshold})
+  for row in rows:
+    change = f"{row['change']:+7.1%}" if row['change'] is not None else '    n/a'
+    print(f"{'!' if row['regression'] else ' '} {change}  {row['metric']}", file=sys.stderr)
+  regressions = [row['metric'] for row in rows if row['regression']]
+  print(f"{len(regressions)} of {len(rows)} metrics slower by more than {threshold:.0%}", file=sys.stderr)
+  return rows
+
+
+def bench_timeline(markers: "markers in the generated session" = 100000, repeat: "runs of every step" = 5):
+  "parsing the timing file of a long session and writing its ffconcat, WebVTT and chapters files"
+  rnd = random.Random(markers)
+  markers = int(markers)
+  with TemporaryDirectory() as tmpdir:
+    timing_file = Path(tmpdir, 'bench-timing.chap')
+    with open(timing_file, 'w') as tf:
+      print('2024-01-01 10:00:00.000000 S', file=tf)
+      t = 0
+      slide = 1
+      for k in range(markers - 1):
+        # long runs of special markers were quadratic in chap2ffconcat
+        if k % 1000 < 200:
+          print(f"{format_ms(t)} {MARKER_SPECIAL}", file=tf)
+        else:
+          print(f"{format_ms(t)} {slide}", file=tf)
+          slide = max(1, slide - 1) if rnd.random() < .2 else slide + 1
+        t += rnd.randint(200, 60000)
+      print(f"{format_ms(t)} {MARKER_END}", file=tf)
+    timeline = read_timeline(timing_file)
+    titles = [f"Slide {label}" for label in timeline.labels]
+    steps = {
+      'parse': lambda: read_timeline(timing_file),
+      'entries': timeline.entries,
+      'duration': timeline.duration,
+      'ffconcat': lambda: timeline.ffconcat('slides/slide-{:03d}.png'),
+      'vtt': lambda: timeline.vtt(titles),
+      'chapters': lambda: timeline.chapters(titles).chap(),
+    }
+    results = []
+    for name, step in steps.items():
+      duration = min(timed(step)[0] for _ in range(int(repeat)))
+      results.append({'step': name, 'seconds': round(duration, 6), 'markers': markers})
+      print(f"{name:>9}: {duration * 1000:.3f}ms for {markers} markers", file=sys.stderr)
+  return results
+
+
+BENCHMARKS = {
+  'rasterize': bench_rasterize,
+  'slideshow': bench_slideshow,
+  'suite': bench_suite,
+  'compare': compare,
+  'timeline': bench_timeline,
+}
+
+def main(benchmark: ("one of: " + ", ".join(BENCHMARKS)), *args):
+  import plac
+  results = plac.call(BENCHMARKS[benchmark], list(args))
+  print(json.dumps(results, indent=2))
+
+if __name__=='__main__':
+  import plac
+  plac.call(main)
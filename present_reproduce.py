@@ -1,19 +1,19 @@
 import subprocess, re, os, signal, math
-from datetime import datetime, timedelta
-from pdf2image import convert_from_path
+from datetime import timedelta
 from PIL import Image,ImageTk,ImageDraw
 from tempfile import TemporaryDirectory,NamedTemporaryFile
 from pathlib import Path
 import configparser
 
 from present import MediaProducer, DEFAULT_CONFIG_FILE
+from pdfpages import load_pages, page_cache_from_config, page_store_from_config, DEFAULT_LOAD_WORKERS
+from mediatools import segment_file
+from timeline import recover_timing_journal, read_timeline
 import tkinter as tk
 from tkinter import simpledialog
 
 import sys
 
-fmt = '%H:%M:%S.%f'
-
 class bullshit():
   
   def __init__(self, project_name, is_screencast_or_presentation, max_h):
@@ -23,15 +23,20 @@ class bullshit():
     self.rec_basepath = Path(os.getcwd()).absolute()
     self.rec_config_file = self.rec_basename + '.config'
     self.rec_timing_file = self.rec_basename + '-timing.chap'
+    # a recording that crashed has only its journal
+    if recover_timing_journal(self.rec_basename + '-timing.journal'):
+      print(f"recovered the timing files from '{self.rec_basename}-timing.journal'")
     self.load_timings(self.rec_timing_file)
     # ~ print(self.rec_timing_markers)
     self.rec_stdout_file = self.rec_basename+'-ffmpeg.log'
     self.load_timing_offsets()
     # ~ print(self.rec_audio_offset)
     
-    animated_slides = Path(self.rec_basename + '-screen.mkv').exists()
-    second_region = Path(self.rec_basename + '-screencast.mkv').exists()
-    webcam = Path(self.rec_basename+'-webcam.mkv').exists()
+    # a paused recording may not be joined yet, its first segment tells what was recorded
+    recorded = lambda suffix: Path(self.rec_basename + suffix).exists() or Path(segment_file(self.rec_basename + suffix, 0)).exists()
+    animated_slides = recorded('-screen.mkv')
+    second_region = recorded('-screencast.mkv')
+    webcam = recorded('-webcam.mkv')
     
     try:
       tmp = tk.Tk()
@@ -50,7 +55,9 @@ class bullshit():
     self.config = config['DEFAULT']
     
     if is_screencast_or_presentation == 'presentation':
-      self.pages = convert_from_path(project_name,size=(None, max_h),dpi=self.config.getint("SlideLoadDpi", 300))
+      self.pages = load_pages(project_name, self.config.getint("SlideLoadDpi", 300), (None, max_h), page_cache_from_config(self.config),
+                              workers=self.config.getint("SlideLoadWorkers", DEFAULT_LOAD_WORKERS),
+                              store=page_store_from_config(self.config))
     elif is_screencast_or_presentation == 'screencast':
       self.pages = []
     else:
@@ -77,15 +84,8 @@ class bullshit():
       
   
   def load_timings(self, tf):
-    with open(tf,'r') as _tf:
-      start = _tf.readline()
-      start = start.replace(' S','').strip()
-      start = datetime.strptime(start, '%Y-%m-%d %H:%M:%S.%f')
-      for line in _tf:
-        t = line.split(' ')[0]
-        dt = datetime.strptime(t, fmt)
-        dt = timedelta(hours=dt.hour, minutes=dt.minute, seconds=dt.second, microseconds=dt.microsecond)
-        self.rec_timing_markers.append((start+dt) - start)
+    timeline = read_timeline(tf)
+    self.rec_timing_markers.extend(timedelta(milliseconds=ms) for ms in timeline.ms)
   
   def load_timing_offsets(self):
     self.rec_audio_offset = '00:00:00.0'
@@ -0,0 +1,256 @@
+import json
+import os
+import time
+from array import array
+from datetime import timedelta
+from pathlib import Path
+
+MARKER_END = 'END'
+MARKER_SPECIAL = 'X'
+
+# the kinds of markers. chapters files are labelled with titles instead of slides
+KIND_SLIDE = 0
+KIND_SPECIAL = 1
+KIND_END = 2
+KIND_LABEL = 3
+
+
+def format_ms(ms, sep='.'):
+  # H:M:S.mmm as in the timing files, WebVTT separates the milliseconds with a comma
+  s, ms = divmod(int(ms), 1000)
+  m, s = divmod(s, 60)
+  h, m = divmod(m, 60)
+  return f"{h:02d}:{m:02d}:{s:02d}{sep}{ms:03d}"
+
+
+def parse_ms(t):
+  # H:M:S.mmm to milliseconds, hours and minutes may be left out like ffmpeg
+  # allows. digits after the milliseconds are ignored
+  parts = t.strip().split(':')
+  s, _, frac = parts[-1].partition('.')
+  ms = int(s or 0) * 1000 + int((frac + '00')[:3])
+  for k, p in enumerate(reversed(parts[:-1])):
+    ms += int(p) * 1000 * 60 ** (k + 1)
+  return ms
+
+
+class Timeline():
+  # the markers of a timing or chapters file: the start of the recording as the
+  # first line has it, and for every marker its time in the recording in
+  # milliseconds, its slide, its kind and its label as written. times, slides and
+  # kinds are arrays, long sessions stay a few flat buffers
+
+  def __init__(self, start=None):
+    self.start = start
+    self.ms = array('q')
+    # 0 for markers that aren't slides
+    self.slides = array('l')
+    self.kinds = array('b')
+    self.labels = []
+
+  def __len__(self):
+    return len(self.ms)
+
+  def append(self, ms, label):
+    label = str(label)
+    if label == MARKER_SPECIAL:
+      kind, slide = KIND_SPECIAL, 0
+    elif label == MARKER_END:
+      kind, slide = KIND_END, 0
+    elif label.isdigit():
+      kind, slide = KIND_SLIDE, int(label)
+    else:
+      kind, slide = KIND_LABEL, 0
+    self.ms.append(ms)
+    self.slides.append(slide)
+    self.kinds.append(kind)
+    self.labels.append(label)
+
+  def duration(self):
+    # the recording ends with its last marker
+    return self.ms[-1] if self.ms else 0
+
+  def entries(self):
+    # (slide, start, end) in milliseconds for every slide shown, slides counted
+    # from 0. special markers are skipped, a slide is shown until the next marker
+    ms, slides, kinds = self.ms, self.slides, self.kinds
+    entries = []
+    current = None
+    for k in range(len(ms)):
+      if kinds[k] == KIND_SPECIAL:
+        continue
+      if current is not None:
+        entries.append((slides[current] - 1, ms[current], ms[k]))
+      current = k if kinds[k] == KIND_SLIDE else None
+    return entries
+
+  def chapters(self, titles):
+    # the markers that start a chapter, labelled with titles[k] of marker k
+    chapters = Timeline(self.start)
+    for k in range(len(self)):
+      if self.kinds[k] not in (KIND_SPECIAL, KIND_END):
+        chapters.append(self.ms[k], titles[k])
+    return chapters
+
+  def chap(self):
+    lines = [f"{self.start} S"]
+    lines.extend(f"{format_ms(t)} {label}" for t, label in zip(self.ms, self.labels))
+    return '\n'.join(lines) + '\n'
+
+  def ffconcat(self, pattern, zero_based=True):
+    # the slide images in the concat demuxer's format, every one lasting until
+    # the next slide change. the last image is repeated, the demuxer ignores the
+    # duration of the last file
+    lines = ["ffconcat version 1.0"]
+    path = None
+    for slide, start, end in self.entries():
+      path = pattern.format(slide if zero_based else slide + 1)
+      lines.append(f"file {path}\nduration {round((end - start) / 1000, 2)}")
+    lines.append(f"file {path}")
+    return '\n'.join(lines)
+
+  def vtt(self, titles=None):
+    # a WebVTT cue from every marker to the next. with titles, a cue is named by
+    # its marker and titled with titles[k], the first one starting at 0, like the
+    # recorder writes them. without, cues are numbered and titled by their label,
+    # after a cue for the beginning. an empty timeline has only the header
+    out = ["WEBVTT\n\n"]
+    if titles is None:
+      # every time starts one cue and ends another, it's formatted once
+      times = [format_ms(t) for t in self.ms]
+      if not times:
+        return ''.join(out)
+      out.append(f"\n0\n00:00:00.000 --> {times[0]}\n- Beginning\n\n")
+      for k in range(len(times) - 1):
+        out.append(f"{k+1}\n{times[k]} --> {times[k+1]}\n- {self.labels[k]}\n\n")
+      return ''.join(out)
+    times = [format_ms(t, ',') for t in self.ms]
+    for k in range(len(times) - 1):
+      if self.kinds[k] != KIND_END:
+        out.append(f"\n{self.labels[k]}\n{times[k] if k > 0 else format_ms(0, ',')} --> {times[k+1]}\n- {titles[k]}\n")
+    return ''.join(out)
+
+
+def read_timeline(path):
+  # reads a timing or chapters file in a single pass
+  timeline = Timeline()
+  with open(path, 'r') as f:
+    start = f.readline().strip()
+    timeline.start = start[:-2] if start.endswith(' S') else start
+    for line in f:
+      t, _, label = line.strip().partition(' ')
+      if t:
+        timeline.append(parse_ms(t), label)
+  return timeline
+
+
+class TimingJournal():
+  # the events of a recording, appended to a single file as one json object per
+  # line: the start, every slide change and marker, and the stop. events carry
+  # the time in the recording in milliseconds, the monotonic time they were
+  # logged at, the slide and its title. the timing file, the chapters and the
+  # WebVTT file are written from the journal when the recording stops, or by
+  # recover_timing_journal if it never did.
+  # adding an event only writes to a buffer, tick() flushes it: right away, or
+  # once flush_interval seconds passed since the last flush. with fsync, flushing
+  # waits until the events are on disk
+
+  def __init__(self, path, flush_interval=0., fsync=False):
+    self.path = Path(path)
+    self.flush_interval = flush_interval
+    self.fsync = fsync
+    self.file = None
+    self.pending = False
+    self.last_flush = time.monotonic()
+
+  def start(self, starttime, timing_file, chapters_file=None, vtt_file=None):
+    # chapters_file and vtt_file are None if they aren't wanted
+    self.file = open(self.path, 'w')
+    self.write({'type': 'start', 'start': str(starttime), 'mono': time.monotonic(),
+                'timing': str(timing_file), 'chapters': chapters_file and str(chapters_file), 'vtt': vtt_file and str(vtt_file)})
+    self.flush()
+
+  def add(self, t, mark, slide, title=None):
+    # t is the time in the recording as a timedelta
+    self.write({'type': 'mark', 'ms': t // timedelta(milliseconds=1), 'mono': time.monotonic(),
+                'mark': str(mark), 'slide': slide, 'title': title})
+    self.pending = True
+
+  def tick(self):
+    if self.file is not None and self.pending and time.monotonic() - self.last_flush >= self.flush_interval:
+      self.flush()
+
+  def stop(self):
+    self.write({'type': 'stop', 'mono': time.monotonic()})
+    self.flush()
+    self.file.close()
+    self.file = None
+    write_timing_files(read_journal(self.path))
+
+  def write(self, event):
+    print(json.dumps(event), file=self.file)
+
+  def flush(self):
+    self.file.flush()
+    if self.fsync:
+      os.fsync(self.file.fileno())
+    self.pending = False
+    self.last_flush = time.monotonic()
+
+
+def timing_journal_from_config(config, path):
+  return TimingJournal(path, config.getfloat('RecordTimingFlushInterval', 0), config.getboolean('RecordTimingFsync', False))
+
+
+def read_journal(path):
+  # a crash may leave the last line incomplete, it's skipped
+  events = []
+  with open(path, 'r') as f:
+    for line in f:
+      try:
+        events.append(json.loads(line))
+      except ValueError:
+        pass
+  return events
+
+
+def write_timing_files(events):
+  start = events[0]
+  timeline = Timeline(start['start'])
+  titles = []
+  for e in events:
+    if e['type'] == 'mark':
+      timeline.append(e['ms'], e['mark'])
+      titles.append(e['title'])
+  with open(start['timing'], 'w') as tf:
+    tf.write(timeline.chap())
+  if start['chapters']:
+    with open(start['chapters'], 'w') as tf:
+      tf.write(timeline.chapters(titles).chap())
+  if start['vtt']:
+    with open(start['vtt'], 'w') as tf:
+      tf.write(timeline.vtt(titles))
+
+
+def recover_timing_journal(path):
+  # writes the timing files of a recording that never stopped, because presenting
+  # crashed or was killed. the recording ends with its last event. returns
+  # whether there was anything to recover
+  path = Path(path)
+  if not path.exists():
+    return False
+  events = read_journal(path)
+  if not events or events[0]['type'] != 'start' or events[-1]['type'] == 'stop':
+    return False
+  marks = [e for e in events if e['type'] == 'mark']
+  recovered = []
+  if marks and marks[-1]['mark'] != MARKER_END:
+    recovered.append(dict(marks[-1], mark=MARKER_END, mono=None))
+  recovered.append({'type': 'stop', 'mono': None, 'recovered': True})
+  with open(path, 'a') as f:
+    # a line cut off by the crash mustn't swallow the recovered events
+    f.write('\n')
+    for e in recovered:
+      print(json.dumps(e), file=f)
+  write_timing_files(events + recovered)
+  return True